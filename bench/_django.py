@@ -0,0 +1,44 @@
+"""
+Shared bootstrap for the benchmark scripts: puts ``src`` on the path, loads
+the project settings and runs everything against a throwaway test database
+so a benchmark never touches real data.
+
+Point it at a database with the usual env vars, e.g. a local SQLite run:
+
+    DATABASE_ENGINE=django.db.backends.sqlite3 python bench/query_plans.py
+"""
+import os
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / 'src'
+sys.path.insert(0, str(SRC_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+
+def setup_database(threaded=False):
+    from django.db import connection, connections
+    from django.test.utils import setup_test_environment
+
+    if threaded and connection.vendor == 'sqlite':
+        # Threads need a shared on-disk file (not per-connection :memory:), and
+        # IMMEDIATE transactions so writers queue on the lock instead of failing
+        import tempfile
+        connection.settings_dict['TEST']['NAME'] = tempfile.mktemp(suffix='.sqlite3')
+        connection.settings_dict['OPTIONS'].update(transaction_mode='IMMEDIATE', timeout=60)
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    # A configured read replica reads the test database too
+    for alias in connections:
+        if connections[alias].settings_dict['TEST'].get('MIRROR') == connection.alias:
+            connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+    return connection
+
+
+def teardown_database(connection, old_name=None):
+    connection.creation.destroy_test_db(old_name or connection.settings_dict['NAME'], verbosity=0)
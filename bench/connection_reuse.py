@@ -0,0 +1,115 @@
+"""
+Requests/sec with and without database connection reuse.
+
+Modes, each in its own process against its own seeded database:
+  * wsgi-close       -- threaded WSGI, DATABASE_CONN_MAX_AGE=0: connect per request
+  * wsgi-persistent  -- threaded WSGI, each thread keeps its connection
+  * asgi-close       -- ASGI with the async views, no pool: connect per request
+  * asgi-pool        -- ASGI with the async views and DATABASE_POOL_SIZE
+
+Requests go to endpoints that always reach the database (my_borrows,
+my_reservations, my_reviews). Every run also reports how many connections
+were opened. The gain is the cost of a connect, so it shows best against a
+real MySQL server (more so over TLS); with SQLite a connect is cheap.
+
+    DATABASE_ENGINE=django.db.backends.sqlite3 python bench/connection_reuse.py
+    python bench/connection_reuse.py --requests 2000 --threads 16 --pool-size 16 --json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+MODES = {
+    'wsgi-close': {'ASYNC_VIEWS': 'false', 'DATABASE_CONN_MAX_AGE': '0', 'DATABASE_POOL_SIZE': '0'},
+    'wsgi-persistent': {'ASYNC_VIEWS': 'false', 'DATABASE_CONN_MAX_AGE': '60', 'DATABASE_POOL_SIZE': '0'},
+    'asgi-close': {'ASYNC_VIEWS': 'true', 'DATABASE_CONN_MAX_AGE': '0', 'DATABASE_POOL_SIZE': '0'},
+    'asgi-pool': {'ASYNC_VIEWS': 'true', 'DATABASE_CONN_MAX_AGE': '0'},
+}
+PATHS = ('/api/borrows/my_borrows/', '/api/reserves/my_reservations/', '/api/reviews/my_reviews/')
+
+
+def child(args):
+    import _django
+    from load_test import summarize
+    from seed import seed
+    from serving_modes import run_asgi, run_wsgi
+
+    from django.db import connections
+    from django.db.models import Count
+
+    from library.authentication import issue_tokens
+    from library.db.pool import close_pools
+    from library.models import User
+
+    db = _django.setup_database(threaded=True)
+    opened = []
+    lock = threading.Lock()
+    # Count real connects in Django's own backend, below any pool
+    backend = next(cls for cls in type(connections['default']).__mro__
+                   if cls.__module__.startswith('django.db.backends.') and 'get_new_connection' in vars(cls))
+    connect = backend.get_new_connection
+
+    def counting_connect(self, conn_params):
+        with lock:
+            opened.append(self.alias)
+        return connect(self, conn_params)
+
+    try:
+        seed(users=args.users, titles=args.titles, borrows=args.borrows, reservations=200, reviews=2000)
+        reader = User.objects.filter(role='Reader').annotate(n=Count('borrow')).order_by('-n').first()
+        token = issue_tokens(reader)['access']
+        requests = [(PATHS[i % len(PATHS)], '') for i in range(args.requests)]
+        db.close()  # the seeding connection shouldn't count
+        backend.get_new_connection = counting_connect
+        if args.run.startswith('wsgi'):
+            samples, wall = run_wsgi(requests, token, args.threads, 0)
+        else:
+            samples, wall = run_asgi(requests, token, args.threads, 0)
+        backend.get_new_connection = connect
+    finally:
+        close_pools()
+        _django.teardown_database(db)
+    result = summarize([(seconds, status, 0) for seconds, status, _ in samples], wall)
+    result['connections_opened'] = len(opened)
+    json.dump(result, sys.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=8, help='WSGI worker threads / concurrent ASGI requests')
+    parser.add_argument('--pool-size', type=int, default=8, help='DATABASE_POOL_SIZE for asgi-pool')
+    parser.add_argument('--modes', default=','.join(MODES), help='comma-separated subset of the modes')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--titles', type=int, default=500)
+    parser.add_argument('--borrows', type=int, default=5000)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    parser.add_argument('--run', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        return child(args)
+
+    results = {}
+    for mode in args.modes.split(','):
+        env = {**os.environ, 'DATABASE_POOL_SIZE': str(args.pool_size), **MODES[mode]}
+        output = subprocess.run(
+            [sys.executable, str(Path(__file__).resolve()), '--run', mode, *sys.argv[1:]],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        results[mode] = result = json.loads(output)
+        latency = result['latency_ms']
+        print(f"{mode:<16} {result['requests']:>5} req  {result['throughput_rps']:>8} req/s  "
+              f"p50 {latency['p50']:>8} ms  p95 {latency['p95']:>8} ms  "
+              f"connections {result['connections_opened']:>5}  errors {result['errors']}", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps({'threads': args.threads, 'pool_size': args.pool_size, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
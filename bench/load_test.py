@@ -0,0 +1,290 @@
+"""
+Drive the real API endpoints concurrently and report latency percentiles,
+throughput and query counts per endpoint.
+
+Requests go through Django's test client, so the full stack is exercised
+(URL routing, JWT authentication, permissions, serializers, the database)
+without a server or network. Each scenario runs on its own against data
+from seed.py:
+
+  login            POST /api/login/
+  catalog_list     GET  /api/books/?page=N
+  catalog_search   GET  /api/books/?search=...
+  overdue_summary  GET  /api/overdue-users/
+  borrow           POST /api/borrows/
+  return           POST /api/borrows/<id>/mark_returned/
+  fulfill          POST /api/reserves/<id>/fulfill/
+
+    DATABASE_ENGINE=django.db.backends.sqlite3 python bench/load_test.py --json results.json
+    python bench/load_test.py --threads 16 --requests 500 --compare results.json
+
+With --compare, exits with status 1 if any scenario's p95 latency grew by
+more than --tolerance against the earlier run.
+"""
+import argparse
+import itertools
+import json
+import math
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import _django
+
+import django
+from django.db import connection
+from django.test import Client, override_settings
+
+from library.authentication import issue_tokens
+from library.models import User, Edition, Book, Borrow, Reserve
+from seed import PASSWORD, seed
+
+# Login throttle rates that never reject: the scenarios measure request cost
+UNTHROTTLED = {'ip': (10 ** 9, 10 ** 9), 'email': (10 ** 9, 10 ** 9)}
+
+SCENARIOS = ['login', 'catalog_list', 'catalog_search', 'overdue_summary', 'borrow', 'return', 'fulfill']
+
+
+def percentile(values, p):
+    # Nearest-rank percentile of an already sorted list
+    if not values:
+        return None
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def bearer(user):
+    return {'HTTP_AUTHORIZATION': f'Bearer {issue_tokens(user)["access"]}'}
+
+
+class Fixtures:
+    # Users, tokens and ids the scenarios draw from, loaded once after seeding
+    def __init__(self, rng):
+        self.rng = rng
+        self.librarian = bearer(User.objects.filter(role='Librarian').first())
+        readers = list(User.objects.filter(role='Reader').order_by('id')[:50])
+        self.reader_emails = [reader.email for reader in readers]
+        self.readers = [(reader.pk, bearer(reader)) for reader in readers]
+        self.pages = max(1, Book.objects.count() // 20)
+        self.terms = ['Title 1', 'Author 7', 'Fiction', 'Title 42', 'Science', 'Author 1']
+
+
+def login_jobs(fx, n):
+    def job(client, email):
+        return client.post('/api/login/', {'email': email, 'password': PASSWORD}, content_type='application/json')
+    return [lambda client, e=fx.rng.choice(fx.reader_emails): job(client, e) for _ in range(n)]
+
+
+def catalog_list_jobs(fx, n):
+    reader = fx.readers[0][1]
+    return [lambda client, page=fx.rng.randint(1, min(fx.pages, 50)): client.get(f'/api/books/?page={page}', **reader)
+            for _ in range(n)]
+
+
+def catalog_search_jobs(fx, n):
+    reader = fx.readers[0][1]
+    return [lambda client, term=fx.rng.choice(fx.terms): client.get('/api/books/', {'search': term}, **reader)
+            for _ in range(n)]
+
+
+def overdue_summary_jobs(fx, n):
+    return [lambda client: client.get('/api/overdue-users/', **fx.librarian) for _ in range(n)]
+
+
+def borrow_jobs(fx, n):
+    # Each request borrows a different available copy
+    book_ids = list(Book.objects.filter(status='Available').values_list('book_id', flat=True)[:n])
+    today = date.today()
+
+    def job(client, book_id, reader):
+        data = {'book': book_id, 'borrow_date': str(today), 'due_date': str(today + timedelta(days=14))}
+        return client.post('/api/borrows/', data, content_type='application/json', **reader)
+    return [lambda client, b=book_id: job(client, b, fx.rng.choice(fx.readers)[1]) for book_id in book_ids]
+
+
+def return_jobs(fx, n):
+    borrow_ids = list(Borrow.objects.filter(return_date__isnull=True).values_list('borrow_id', flat=True)[:n])
+    return [lambda client, pk=pk: client.post(f'/api/borrows/{pk}/mark_returned/', **fx.librarian)
+            for pk in borrow_ids]
+
+
+def fulfill_jobs(fx, n):
+    # Fresh pending reservations, at most one per available copy
+    wanted = []
+    for isbn, available in Edition.objects.filter(available_copies__gt=0).values_list('isbn', 'available_copies'):
+        wanted.extend([isbn] * min(available, n - len(wanted)))
+        if len(wanted) >= n:
+            break
+    reservations = Reserve.objects.bulk_create([
+        Reserve(user_id=fx.rng.choice(fx.readers)[0], isbn=isbn, status='Pending') for isbn in wanted
+    ])
+    Edition.objects.sync(isbns=set(wanted))
+    ids = [r.pk for r in reservations] if reservations and reservations[0].pk else list(
+        Reserve.objects.filter(status='Pending').order_by('-reserve_id').values_list('reserve_id', flat=True)[:len(wanted)]
+    )
+    return [lambda client, pk=pk: client.post(f'/api/reserves/{pk}/fulfill/', **fx.librarian) for pk in ids]
+
+
+JOBS = {
+    'login': login_jobs,
+    'catalog_list': catalog_list_jobs,
+    'catalog_search': catalog_search_jobs,
+    'overdue_summary': overdue_summary_jobs,
+    'borrow': borrow_jobs,
+    'return': return_jobs,
+    'fulfill': fulfill_jobs,
+}
+
+
+def run_scenario(jobs, threads):
+    # Returns one (seconds, status, queries) sample per job
+    local = threading.local()
+
+    def call(job):
+        if not hasattr(local, 'client'):
+            local.client = Client()
+        queries = itertools.count()
+
+        def count(execute, sql, params, many, context):
+            next(queries)
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        with connection.execute_wrapper(count):
+            response = job(local.client)
+        elapsed = time.perf_counter() - start
+        return elapsed, response.status_code, next(queries)
+
+    # Each worker thread opened its own connection; the barrier makes every
+    # thread run exactly one of the closing calls
+    barrier = threading.Barrier(threads)
+
+    def close_connection(_):
+        barrier.wait()
+        connection.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        samples = list(pool.map(call, jobs))
+        elapsed = time.perf_counter() - start
+        list(pool.map(close_connection, range(threads)))
+    return samples, elapsed
+
+
+def summarize(samples, wall):
+    latencies = sorted(seconds * 1000 for seconds, _, _ in samples)
+    queries = sorted(q for _, _, q in samples)
+    statuses = Counter(status for _, status, _ in samples)
+    return {
+        'requests': len(samples),
+        'errors': sum(n for status, n in statuses.items() if status >= 400),
+        'status_codes': {str(status): n for status, n in sorted(statuses.items())},
+        'throughput_rps': round(len(samples) / wall, 1) if wall else None,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 2) if latencies else None,
+            'p50': round(percentile(latencies, 50), 2) if latencies else None,
+            'p95': round(percentile(latencies, 95), 2) if latencies else None,
+            'p99': round(percentile(latencies, 99), 2) if latencies else None,
+            'max': round(latencies[-1], 2) if latencies else None,
+        },
+        'queries': {
+            'mean': round(sum(queries) / len(queries), 1) if queries else None,
+            'p95': percentile(queries, 95),
+            'max': queries[-1] if queries else None,
+        },
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    # Print p95 changes against an earlier run; returns the regressed scenarios
+    regressed = []
+    for name, result in results.items():
+        before = baseline.get('results', {}).get(name, {}).get('latency_ms', {}).get('p95')
+        after = result['latency_ms']['p95']
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        flag = 'REGRESSED' if change > tolerance else ''
+        print(f'{name:<16} p95 {before:>9.2f} -> {after:>9.2f} ms  {change:+.0%}  {flag}')
+        if flag:
+            regressed.append(name)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--titles', type=int, default=2000)
+    parser.add_argument('--borrows', type=int, default=20000)
+    parser.add_argument('--reservations', type=int, default=2000)
+    parser.add_argument('--reviews', type=int, default=10000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, help='repeatable; default all')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', metavar='PATH', help="write results as JSON ('-' for stdout)")
+    parser.add_argument('--compare', metavar='PATH', help='earlier --json output to compare p95 against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p95 growth, as a fraction')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    db = _django.setup_database(threaded=True)
+    try:
+        seed(users=args.users, titles=args.titles, borrows=args.borrows,
+             reservations=args.reservations, reviews=args.reviews, rng=random.Random(args.seed))
+        fixtures = Fixtures(rng)
+        results = {}
+        for name in args.scenario or SCENARIOS:
+            jobs = JOBS[name](fixtures, args.requests)
+            with override_settings(LOGIN_THROTTLE_RATES=UNTHROTTLED):
+                samples, wall = run_scenario(jobs, args.threads)
+            results[name] = summarize(samples, wall)
+            latency, queries = results[name]['latency_ms'], results[name]['queries']
+            print(f"{name:<16} {results[name]['requests']:>5} req  {results[name]['throughput_rps']:>8} req/s  "
+                  f"p50 {latency['p50']:>8} ms  p95 {latency['p95']:>8} ms  p99 {latency['p99']:>8} ms  "
+                  f"queries {queries['mean']:>5}  errors {results[name]['errors']}", file=sys.stderr)
+        vendor = db.vendor
+    finally:
+        _django.teardown_database(db)
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'database': vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'threads': args.threads,
+            'requests_per_scenario': args.requests,
+            'dataset': {key: getattr(args, key) for key in ('users', 'titles', 'borrows', 'reservations', 'reviews')},
+        },
+        'results': results,
+    }
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w') as stream:
+            json.dump(report, stream, indent=2)
+
+    if args.compare:
+        with open(args.compare) as stream:
+            if compare(results, json.load(stream), args.tolerance):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
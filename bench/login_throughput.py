@@ -0,0 +1,110 @@
+"""
+Measure POST /api/login/ throughput for each password hasher, the cost of
+upgrading stored hashes on login, and how cheaply the login throttle turns
+away a brute-force flood.
+
+Scenarios:
+  * <hasher>   -- concurrent successful logins of users whose passwords are
+                  stored with that hasher (argon2 only with argon2-cffi).
+  * upgrade    -- users with PBKDF2 hashes log in twice with the preferred
+                  hasher set to scrypt: the first round re-hashes, the second
+                  only verifies scrypt.
+  * flood      -- wrong passwords for one email from one address, with the
+                  configured LOGIN_THROTTLE_RATES.
+
+    DATABASE_ENGINE=django.db.backends.sqlite3 python bench/login_throughput.py
+    python bench/login_throughput.py --threads 16 --logins 400 --json
+"""
+import argparse
+import json
+
+import _django
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.test import override_settings
+
+from library.models import User
+from load_test import UNTHROTTLED, run_scenario, summarize
+
+PASSWORD = 'bench-password'
+
+
+def hashers_first(name):
+    classes = settings.PASSWORD_HASHER_CLASSES
+    return [classes[name]] + [path for other, path in classes.items() if other != name]
+
+
+def available(name):
+    try:
+        with override_settings(PASSWORD_HASHERS=hashers_first(name)):
+            get_hasher('default').encode(PASSWORD, 'benchsalt')
+        return True
+    except ValueError:  # hasher library not installed
+        return False
+
+
+def create_users(prefix, n, encoded):
+    User.objects.bulk_create([
+        User(email=f'{prefix}{i}@example.com', name=f'{prefix} {i}', role='Reader', password=encoded)
+        for i in range(n)
+    ])
+    return [f'{prefix}{i}@example.com' for i in range(n)]
+
+
+def login_jobs(emails, password=PASSWORD):
+    return [
+        lambda client, email=email: client.post(
+            '/api/login/', {'email': email, 'password': password}, content_type='application/json')
+        for email in emails
+    ]
+
+
+def report(name, samples, wall):
+    result = summarize(samples, wall)
+    latency = result['latency_ms']
+    print(f"{name:<16} {result['requests']:>5} req  {result['throughput_rps']:>8} req/s  "
+          f"p50 {latency['p50']:>8} ms  p95 {latency['p95']:>8} ms  status {result['status_codes']}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--logins', type=int, default=100, help='logins per scenario')
+    parser.add_argument('--flood', type=int, default=300, help='attempts in the flood scenario')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    results = {}
+    db = _django.setup_database(threaded=True)
+    try:
+        with override_settings(LOGIN_THROTTLE_RATES=UNTHROTTLED):
+            for name in settings.PASSWORD_HASHER_CLASSES:
+                if not available(name):
+                    print(f'{name:<16} skipped (hasher library not installed)')
+                    continue
+                with override_settings(PASSWORD_HASHERS=hashers_first(name)):
+                    emails = create_users(name, args.logins, make_password(PASSWORD))
+                    results[name] = report(name, *run_scenario(login_jobs(emails), args.threads))
+
+            with override_settings(PASSWORD_HASHERS=hashers_first('pbkdf2')):
+                emails = create_users('upgrade', args.logins, make_password(PASSWORD))
+            with override_settings(PASSWORD_HASHERS=hashers_first('scrypt')):
+                for label in ('upgrade_first', 'upgrade_second'):
+                    results[label] = report(label, *run_scenario(login_jobs(emails), args.threads))
+                upgraded = User.objects.filter(email__in=emails, password__startswith='scrypt$').count()
+                print(f'{"":<16} {upgraded}/{len(emails)} hashes now scrypt')
+
+        emails = create_users('flood', 1, make_password(PASSWORD))
+        jobs = login_jobs(emails * args.flood, password='wrong-password')
+        results['flood'] = report('flood', *run_scenario(jobs, args.threads))
+    finally:
+        _django.teardown_database(db)
+
+    if args.json:
+        print(json.dumps({'vendor': db.vendor, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+CI-style N+1 check for the list endpoints: every endpoint must run the same
+number of queries for a page of 5 rows as for a page of 50, and stay within
+its budget. Exits with status 1 on any regression.
+
+    DATABASE_ENGINE=django.db.backends.sqlite3 python bench/query_counts.py
+"""
+import sys
+from datetime import date, timedelta
+
+import _django
+
+from rest_framework.test import APIClient
+
+from library import caching, search
+from library.authentication import denylist, issue_tokens
+from library.models import User, Edition, Book, Borrow, Reserve, Review, LibraryCard, Reader
+from library.testing import assert_max_queries, assert_queries_constant
+
+PAGE = '?page_size=100'
+
+# endpoint -> most queries allowed for one request (JWT authentication needs none)
+BUDGETS = {
+    '/api/books/' + PAGE: 2,
+    '/api/books/' + PAGE + '&expand=edition': 2,
+    '/api/books/' + PAGE + '&search=title': 2,
+    '/api/editions/' + PAGE: 2,
+    '/api/borrows/' + PAGE: 2,
+    '/api/borrows/' + PAGE + '&expand=book,user': 2,
+    '/api/borrows/?paging=cursor&expand=book,user': 1,
+    '/api/borrows/my_borrows/' + PAGE + '&expand=book': 2,
+    '/api/reserves/' + PAGE + '&expand=user,edition': 2,
+    '/api/reviews/' + PAGE + '&expand=user,edition': 2,
+    '/api/library-cards/' + PAGE: 2,
+    '/api/readers/' + PAGE: 2,
+    '/api/users/' + PAGE: 2,
+}
+
+
+def add_rows(librarian, count):
+    start = User.objects.count()
+    readers = User.objects.bulk_create([
+        User(email=f'n1-{start + i}@example.com', name='Reader', role='Reader', password='!')
+        for i in range(count)
+    ])
+    Book.objects.bulk_create([
+        Book(title=f'Title {start + i}', author='Author', isbn=f'isbn-{start + i}', status='Available',
+             category='Fiction', shelf_loc='A1')
+        for i in range(count)
+    ])
+    Edition.objects.sync()
+    books = list(Book.objects.order_by('-book_id')[:count])
+    today = date.today()
+    Borrow.objects.bulk_create([
+        Borrow(user=reader, book=book, borrow_date=today, due_date=today + timedelta(days=14))
+        for reader, book in zip(readers, books)
+    ] + [
+        Borrow(user=librarian, book=book, borrow_date=today, due_date=today + timedelta(days=14))
+        for book in books
+    ])
+    Reserve.objects.bulk_create([Reserve(user=r, isbn=b.isbn, status='Pending') for r, b in zip(readers, books)])
+    Review.objects.bulk_create([Review(user=r, isbn=b.isbn, rating=4, comment='ok') for r, b in zip(readers, books)])
+    Edition.objects.sync()
+    LibraryCard.objects.bulk_create([LibraryCard(user=r) for r in readers])
+    Reader.objects.bulk_create([Reader(user=r) for r in readers])
+    # bulk_create skips the signals that keep the search index current
+    search.index.rebuild()
+
+
+def main():
+    db = _django.setup_database()
+    failures = []
+    try:
+        librarian = User.objects.create_user('librarian@example.com', 'pw', role='Librarian')
+        client = APIClient()
+        # A real token rather than force_authenticate, which the async views don't see
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {issue_tokens(librarian)['access']}")
+        denylist()  # load the cached revocation list up front
+        add_rows(librarian, 5)
+
+        for url, budget in BUDGETS.items():
+            def fetch():
+                # Measure the database path, not the response cache
+                caching.touch('book', 'review')
+                response = client.get(url)
+                assert response.status_code == 200, (url, response.status_code)
+
+            try:
+                count = assert_queries_constant(fetch, grow=lambda: add_rows(librarian, 45))
+                with assert_max_queries(budget):
+                    fetch()
+                print(f'ok    {count:>2} queries  {url}')
+            except AssertionError as exc:
+                failures.append(url)
+                print(f'FAIL  {url}\n{exc}')
+    finally:
+        _django.teardown_database(db)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Compare query plans and timings for the hot filter queries with and without
+the indexes added by migration 0004 and later migrations (dropped and
+re-created in place), on a seeded throwaway database. "before" has only the
+indexes of the initial schema; the migrations measured are listed in the output.
+
+    DATABASE_ENGINE=django.db.backends.sqlite3 python bench/query_plans.py
+    python bench/query_plans.py --borrows 200000 --json > plans.json
+"""
+import argparse
+import importlib
+import json
+import pkgutil
+import statistics
+import time
+from datetime import timedelta
+
+import _django
+from seed import seed
+
+from django.apps import apps
+from django.db.migrations import AddIndex
+from django.db.models import Count
+from django.utils import timezone
+
+from library.models import Book, Borrow, Reserve, Review
+
+# The first migration adding hot-filter indexes; later ones count too
+FIRST_INDEX_MIGRATION = '0004_hot_filter_indexes'
+
+
+def index_migrations():
+    import library.migrations
+    names = sorted(module.name for module in pkgutil.iter_modules(library.migrations.__path__))
+    return [name for name in names if name >= FIRST_INDEX_MIGRATION]
+
+
+def index_operations():
+    # (migration, model, index) for indexes the index migrations added that are still on the model
+    # (later migrations may have replaced some of them)
+    found = []
+    for name in index_migrations():
+        migration = importlib.import_module(f'library.migrations.{name}').Migration
+        for operation in migration.operations:
+            if isinstance(operation, AddIndex):
+                model = apps.get_model('library', operation.model_name)
+                if operation.index.name in {index.name for index in model._meta.indexes}:
+                    found.append((name, model, operation.index))
+    return found
+
+
+def drop_indexes(connection):
+    with connection.schema_editor() as editor:
+        for _, model, index in index_operations():
+            editor.remove_index(model, index)
+
+
+def create_indexes(connection):
+    with connection.schema_editor() as editor:
+        for _, model, index in index_operations():
+            editor.add_index(model, index)
+
+
+def hot_queries():
+    today = timezone.now().date()
+    isbn = Book.objects.values_list('isbn', flat=True).first()
+    user_id = Borrow.objects.values_list('user_id', flat=True).first()
+    return {
+        'fulfill: available copy of isbn': Book.objects.filter(isbn=isbn, status='Available')[:1],
+        'reviews for isbn': Review.objects.filter(isbn=isbn),
+        'pending reservations for isbn': Reserve.objects.filter(isbn=isbn, status='Pending'),
+        'overdue borrows': Borrow.objects.filter(return_date__isnull=True, due_date__lt=today),
+        'due soon borrows': Borrow.objects.filter(
+            return_date__isnull=True, due_date__range=[today, today + timedelta(days=3)]),
+        'overdue users summary': Borrow.objects.filter(
+            return_date__isnull=True, due_date__lt=today,
+        ).values('user__email').annotate(overdue_count=Count('borrow_id')),
+        'active borrows of user': Borrow.objects.filter(user_id=user_id, return_date__isnull=True),
+        'books by status': Book.objects.filter(status='Borrowed'),
+    }
+
+
+def analyze(connection):
+    # Refresh planner statistics so both runs see the same data distribution
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            for model in (Book, Borrow, Reserve, Review):
+                cursor.execute(f'ANALYZE TABLE {model._meta.db_table}')
+        else:
+            cursor.execute('ANALYZE')
+
+
+def measure(queries, repeat):
+    results = {}
+    for name, queryset in queries.items():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(queryset.all())
+            timings.append((time.perf_counter() - start) * 1000)
+        results[name] = {
+            'plan': queryset.explain(),
+            'median_ms': round(statistics.median(timings), 3),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--titles', type=int, default=5000)
+    parser.add_argument('--borrows', type=int, default=50000)
+    parser.add_argument('--reviews', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    migrations = [[name, index.name] for name, _, index in index_operations()]
+    connection = _django.setup_database()
+    try:
+        seed(users=args.users, titles=args.titles, borrows=args.borrows, reviews=args.reviews)
+        report = {}
+        for label, change_indexes in (('before', drop_indexes), ('after', create_indexes)):
+            change_indexes(connection)
+            analyze(connection)
+            report[label] = measure(hot_queries(), args.repeat)
+    finally:
+        _django.teardown_database(connection)
+
+    if args.json:
+        print(json.dumps({'vendor': connection.vendor, 'migrations': migrations, **report}, indent=2))
+        return
+
+    print(f"indexes from: {', '.join(sorted({name for name, _ in migrations}))}")
+
+    for name in report['before']:
+        before, after = report['before'][name], report['after'][name]
+        print(f'== {name}')
+        for label, result in (('before', before), ('after', after)):
+            plan = result['plan'].replace('\n', '\n' + ' ' * 12)
+            print(f'   {label:<6} {result["median_ms"]:>8} ms  {plan}')
+
+
+if __name__ == '__main__':
+    main()
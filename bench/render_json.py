@@ -0,0 +1,98 @@
+"""
+Render time and response size of a 10k-row book list.
+
+For the full BookSerializer output and a ?fields=book_id,title,status
+sparse fieldset, reports the time to serialize the rows, to render them with
+DRF's stdlib JSONRenderer and with library.renderers.FastJSONRenderer
+(orjson), and the body size raw, gzipped and brotli-compressed (brotli only
+with the brotli package). Rows are built in memory, so no database is needed.
+
+    python bench/render_json.py
+    python bench/render_json.py --rows 10000 --repeat 5 --json
+"""
+import argparse
+import json
+import random
+import time
+
+import _django  # noqa: F401  (loads the settings)
+
+from django.utils import timezone
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+
+from library import compression, renderers
+from library.models import Book
+from library.serializers import BookSerializer
+
+SPARSE = ['book_id', 'title', 'status']
+
+
+def make_books(n):
+    rng = random.Random(0)
+    now = timezone.now()
+    statuses = [status for status, _ in Book.STATUS_CHOICES]
+    return [
+        Book(book_id=i, title=f'Title {rng.randrange(10 ** 6)} of the series', author=f'Author {rng.randrange(5000)}',
+             isbn=f'978{rng.randrange(10 ** 10):010d}', status=rng.choice(statuses), category=f'Category {i % 40}',
+             shelf_loc=f'S{i % 300}', edition_id=i // 3 + 1, updated_at=now)
+        for i in range(1, n + 1)
+    ]
+
+
+def best(fn, repeat):
+    # Best wall time in ms over repeat runs, and the last result
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return round(min(times), 2), result
+
+
+def measure(books, fields, repeat):
+    context = {'expand': [], 'fields': fields}
+    serialize_ms, data = best(lambda: BookSerializer(books, many=True, context=context).data, repeat)
+    stdlib_ms, body = best(lambda: JSONRenderer().render(data), repeat)
+    result = {
+        'serialize_ms': serialize_ms,
+        'render_ms': {'stdlib': stdlib_ms},
+        'bytes': {'raw': len(body)},
+    }
+    if renderers.orjson is not None:
+        fast_ms, fast_body = best(lambda: renderers.FastJSONRenderer().render(data), repeat)
+        assert fast_body == body, 'FastJSONRenderer output differs from JSONRenderer'
+        result['render_ms']['orjson'] = fast_ms
+    gzip_ms, gzipped = best(lambda: compress_string(body), repeat)
+    result['bytes']['gzip'] = len(gzipped)
+    result['compress_ms'] = {'gzip': gzip_ms}
+    if compression.brotli is not None:
+        br_ms, compressed = best(lambda: compression.brotli.compress(body, quality=compression.BROTLI_QUALITY), repeat)
+        result['bytes']['br'] = len(compressed)
+        result['compress_ms']['br'] = br_ms
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5, help='runs per step; the best is reported')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    books = make_books(args.rows)
+    results = {'full': measure(books, None, args.repeat), 'sparse': measure(books, SPARSE, args.repeat)}
+    for name, result in results.items():
+        render = '  '.join(f'{key} {value:>8} ms' for key, value in result['render_ms'].items())
+        compress = '  '.join(f'{key} {value:>7} ms' for key, value in result['compress_ms'].items())
+        size = '  '.join(f'{key} {value:>9}' for key, value in result['bytes'].items())
+        print(f"{name:<7} serialize {result['serialize_ms']:>8} ms  render: {render}  compress: {compress}  bytes: {size}")
+    if renderers.orjson is None:
+        print('orjson is not installed: only the stdlib renderer was measured')
+
+    if args.json:
+        print(json.dumps({'rows': args.rows, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
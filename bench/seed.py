@@ -0,0 +1,104 @@
+"""
+Seed a library database with synthetic users, copies, loans, reservations
+and reviews.
+
+Activity is skewed the way a real catalog is: title popularity and reader
+activity follow a Zipf-like curve, popular titles have more copies and
+longer hold queues, loans cluster in the recent past and ratings lean
+positive. Every seeded user can log in with PASSWORD; about 1% of them are
+librarians.
+"""
+import random
+from datetime import date, timedelta
+
+import _django  # noqa: F401  (configures Django)
+
+from django.contrib.auth.hashers import make_password
+
+from library.models import User, Edition, Book, Borrow, OpenLoan, Reserve, Review
+
+CATEGORIES = ['Fiction', 'Science', 'History', 'Children', 'Art', 'Computing', 'Travel', 'Poetry']
+BATCH_SIZE = 2000
+PASSWORD = 'bench-password'
+
+# Share of ratings 1..5
+RATING_WEIGHTS = [5, 8, 17, 35, 35]
+
+
+def zipf_weights(n, s=1.1):
+    # Weight of the item at each popularity rank: a few items get most of the traffic
+    return [1 / rank ** s for rank in range(1, n + 1)]
+
+
+def seed(users=1000, titles=2000, copies_per_title=3, borrows=20000,
+         reservations=2000, reviews=10000, rng=None):
+    rng = rng or random.Random(42)
+    today = date.today()
+
+    # One hash for everybody: hashing per user would dominate the seeding time
+    password = make_password(PASSWORD)
+    User.objects.bulk_create([
+        User(email=f'reader{i}@example.com', name=f'Reader {i}', password=password,
+             role='Librarian' if i % 100 == 0 else 'Reader')
+        for i in range(users)
+    ], batch_size=BATCH_SIZE)
+    user_ids = list(User.objects.filter(role='Reader').values_list('id', flat=True))
+    user_weights = zipf_weights(len(user_ids), s=0.8)
+
+    # Titles in popularity order; the top tenth gets twice the copies
+    isbns = [f'978-{i:09d}' for i in range(titles)]
+    title_weights = zipf_weights(titles)
+    category_weights = zipf_weights(len(CATEGORIES), s=0.7)
+    Book.objects.bulk_create([
+        Book(
+            title=f'Title {i}', author=f'Author {i % 500}', isbn=isbn, status='Available',
+            category=rng.choices(CATEGORIES, category_weights)[0], shelf_loc=f'S{i % 40}',
+        )
+        for i, isbn in enumerate(isbns)
+        for _ in range(copies_per_title * 2 if i < titles // 10 else max(1, copies_per_title - 1))
+    ], batch_size=BATCH_SIZE)
+    copies = {}
+    for book_id, isbn in Book.objects.values_list('book_id', 'isbn'):
+        copies.setdefault(isbn, []).append(book_id)
+
+    # Mostly returned history weighted toward recent months. Loans from the
+    # last few weeks are often still out, a thin tail is long overdue.
+    loans = []
+    out = set()
+    for isbn, user_id in zip(rng.choices(isbns, title_weights, k=borrows),
+                             rng.choices(user_ids, user_weights, k=borrows)):
+        book_id = rng.choice(copies[isbn])
+        age = min(int(rng.expovariate(1 / 180)), 3 * 365)
+        borrowed = today - timedelta(days=age)
+        due = borrowed + timedelta(days=14)
+        open_loan = book_id not in out and rng.random() < (0.6 if age <= 30 else 0.005)
+        if open_loan:
+            out.add(book_id)
+        kept = rng.randint(1, 14) if rng.random() < 0.85 else rng.randint(15, 45)
+        returned = None if open_loan else min(today, borrowed + timedelta(days=kept))
+        loans.append(Borrow(
+            user_id=user_id, book_id=book_id, borrow_date=borrowed,
+            due_date=due, return_date=returned,
+            delay_status=bool(returned and returned > due),
+        ))
+    Borrow.objects.bulk_create(loans, batch_size=BATCH_SIZE)
+    Book.objects.filter(book_id__in=out).update(status='Borrowed')
+
+    # Hold queues form on the popular titles
+    Reserve.objects.bulk_create([
+        Reserve(user_id=user_id, isbn=isbn, status=rng.choices(['Pending', 'Fulfilled', 'Canceled'], [5, 4, 1])[0])
+        for isbn, user_id in zip(rng.choices(isbns, title_weights, k=reservations),
+                                 rng.choices(user_ids, user_weights, k=reservations))
+    ], batch_size=BATCH_SIZE)
+
+    Review.objects.bulk_create([
+        Review(user_id=user_id, isbn=isbn, rating=rng.choices(range(1, 6), RATING_WEIGHTS)[0],
+               comment='Seeded review')
+        for isbn, user_id in zip(rng.choices(isbns, title_weights, k=reviews),
+                                 rng.choices(user_ids, user_weights, k=reviews))
+    ], batch_size=BATCH_SIZE)
+
+    # bulk_create skips model save(), so link rows to editions and fill the
+    # open-loan ledger in bulk
+    Edition.objects.sync()
+    OpenLoan.objects.sweep()
@@ -0,0 +1,194 @@
+"""
+Compare the WSGI path (DRF views on a fixed pool of worker threads, like
+gunicorn's gthread workers) with the ASGI path (library.async_views on one
+event loop, like a uvicorn worker) when clients are slow.
+
+Every client trickles its request in over --client-delay ms. A WSGI worker
+thread is held for that whole time, an ASGI worker just waits for the body
+on the event loop. Requests cycle over the endpoints async_views serves:
+catalog list and detail, my_borrows, my_reservations, my_reviews and stats.
+Both modes run in their own process against their own seeded database and
+call Django's WSGIHandler / ASGIHandler directly, without a network.
+
+    DATABASE_ENGINE=django.db.backends.sqlite3 python bench/serving_modes.py
+    python bench/serving_modes.py --clients 128 --threads 8 --client-delay 50 --json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+MODES = ('wsgi', 'asgi')
+
+
+def endpoints(reader_id, book_ids):
+    paths = []
+    for i, book_id in enumerate(book_ids):
+        paths += [
+            ('/api/books/', f'page={i % 20 + 1}'),
+            (f'/api/books/{book_id}/', ''),
+            ('/api/borrows/my_borrows/', ''),
+            ('/api/reserves/my_reservations/', ''),
+            ('/api/reviews/my_reviews/', ''),
+            ('/api/stats/', ''),
+            (f'/api/stats/users/{reader_id}/', ''),
+        ]
+    return paths
+
+
+def run_wsgi(requests, token, threads, delay):
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connection
+
+    handler = WSGIHandler()
+
+    def call(request):
+        path, query = request
+        start = time.perf_counter()
+        time.sleep(delay)  # the worker thread waits for the slow client's request
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+            'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'testserver', 'HTTP_AUTHORIZATION': f'Bearer {token}',
+            'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(b''), 'wsgi.errors': sys.stderr,
+        }
+        status = []
+        body = b''.join(handler(environ, lambda s, headers: status.append(int(s.split()[0]))))
+        return time.perf_counter() - start, status[0], len(body)
+
+    barrier = threading.Barrier(threads)
+
+    def close_connection(_):
+        barrier.wait()
+        connection.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        samples = list(pool.map(call, requests))
+        wall = time.perf_counter() - start
+        list(pool.map(close_connection, range(threads)))
+    return samples, wall
+
+
+def run_asgi(requests, token, clients, delay):
+    from django.core.handlers.asgi import ASGIHandler
+
+    handler = ASGIHandler()
+
+    async def call(request, slots):
+        path, query = request
+        async with slots:
+            start = time.perf_counter()
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+                'query_string': query.encode(), 'root_path': '',
+                'headers': [(b'host', b'testserver'), (b'authorization', f'Bearer {token}'.encode())],
+                'server': ('testserver', 80), 'client': ('127.0.0.1', 50000),
+            }
+            finished = asyncio.Event()
+            messages = iter([{'type': 'http.request', 'body': b'', 'more_body': False}])
+            response = {'body': b''}
+
+            async def receive():
+                message = next(messages, None)
+                if message is not None:
+                    await asyncio.sleep(delay)  # the slow client's request
+                    return message
+                await finished.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    response['status'] = message['status']
+                elif message['type'] == 'http.response.body':
+                    response['body'] += message.get('body', b'')
+                    if not message.get('more_body'):
+                        finished.set()
+
+            await handler(scope, receive, send)
+            return time.perf_counter() - start, response['status'], len(response['body'])
+
+    async def main():
+        slots = asyncio.Semaphore(clients)
+        start = time.perf_counter()
+        samples = await asyncio.gather(*(call(request, slots) for request in requests))
+        return samples, time.perf_counter() - start
+
+    return asyncio.run(main())
+
+
+def child(args):
+    # One mode, in a process whose URLconf was loaded with ASYNC_VIEWS set for it
+    import _django
+    from load_test import summarize
+    from seed import seed
+
+    from django.conf import settings
+    from django.db.models import Count
+
+    from library.authentication import issue_tokens
+    from library.models import User, Book
+
+    assert settings.ASYNC_VIEWS == (args.run == 'asgi')
+    db = _django.setup_database(threaded=True)
+    try:
+        seed(users=args.users, titles=args.titles, borrows=args.borrows, reservations=200, reviews=2000)
+        reader = User.objects.filter(role='Reader').annotate(n=Count('borrow')).order_by('-n').first()
+        token = issue_tokens(reader)['access']
+        book_ids = list(Book.objects.order_by('?').values_list('book_id', flat=True)[:args.requests // 7 + 1])
+        requests = endpoints(reader.pk, book_ids)[:args.requests]
+        if args.run == 'wsgi':
+            samples, wall = run_wsgi(requests, token, args.threads, args.client_delay / 1000)
+        else:
+            samples, wall = run_asgi(requests, token, args.clients, args.client_delay / 1000)
+    finally:
+        _django.teardown_database(db)
+    json.dump(summarize([(seconds, status, 0) for seconds, status, _ in samples], wall), sys.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=700)
+    parser.add_argument('--clients', type=int, default=64, help='concurrent clients')
+    parser.add_argument('--threads', type=int, default=8, help='WSGI worker threads')
+    parser.add_argument('--client-delay', type=float, default=200, help='ms each client takes to send its request')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--titles', type=int, default=1000)
+    parser.add_argument('--borrows', type=int, default=10000)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    parser.add_argument('--run', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        return child(args)
+
+    results = {}
+    for mode in MODES:
+        env = {**os.environ, 'ASYNC_VIEWS': 'true' if mode == 'asgi' else 'false'}
+        output = subprocess.run(
+            [sys.executable, str(Path(__file__).resolve()), '--run', mode, *sys.argv[1:]],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        results[mode] = result = json.loads(output)
+        latency = result['latency_ms']
+        print(f"{mode:<5} {result['requests']:>5} req  {result['throughput_rps']:>8} req/s  "
+              f"p50 {latency['p50']:>8} ms  p95 {latency['p95']:>8} ms  p99 {latency['p99']:>8} ms  "
+              f"errors {result['errors']}", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps({
+            'clients': args.clients, 'threads': args.threads, 'client_delay_ms': args.client_delay,
+            'results': results,
+        }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
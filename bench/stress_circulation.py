@@ -0,0 +1,149 @@
+"""
+Hammer the circulation service from many threads at once and check that no
+copy is ever handed out twice.
+
+Scenarios:
+  * fulfill   -- many librarians fulfill pending reservations of one popular
+                 ISBN in parallel; every copy must go to exactly one reader.
+  * borrow    -- many readers try to borrow the very same copy; exactly one
+                 may succeed.
+
+    DATABASE_ENGINE=django.db.backends.sqlite3 python bench/stress_circulation.py
+    python bench/stress_circulation.py --threads 64 --copies 200 --reservations 1000
+
+Exits with status 1 if any invariant is violated. SQLite serializes writers
+on its database lock, so there the run mostly checks the bookkeeping; point
+it at MySQL to exercise row-level races and SKIP LOCKED.
+"""
+import argparse
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import _django
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from library import services
+from library.models import User, Edition, Book, Borrow, Reserve
+from library.services import CirculationError
+
+ISBN = '978-0000000001'
+
+
+def run_in_threads(threads, jobs, work):
+    # Each worker thread gets its own DB connection; close it when done
+    def call(job):
+        try:
+            return work(job)
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(call, jobs))
+    return results, time.perf_counter() - start
+
+
+def fulfill_scenario(threads, copies, reservations):
+    readers = User.objects.bulk_create([
+        User(email=f'stress{i}@example.com', name=f'Stress {i}', role='Reader', password='!')
+        for i in range(reservations)
+    ])
+    Book.objects.bulk_create([
+        Book(title='Popular', author='Someone', isbn=ISBN, status='Available', category='Fiction', shelf_loc='A1')
+        for _ in range(copies)
+    ])
+    Reserve.objects.bulk_create([Reserve(user=reader, isbn=ISBN, status='Pending') for reader in readers])
+    Edition.objects.sync()
+
+    def fulfill(reservation):
+        try:
+            return services.fulfill_reservation(reservation).book_id
+        except CirculationError as exc:
+            return exc.message
+
+    results, elapsed = run_in_threads(threads, list(Reserve.objects.all()), fulfill)
+
+    errors = []
+    allocated = Counter(r for r in results if isinstance(r, int))
+    double = [book_id for book_id, n in allocated.items() if n > 1]
+    if double:
+        errors.append(f'{len(double)} copies allocated more than once')
+    if len(allocated) != min(copies, reservations):
+        errors.append(f'{len(allocated)} copies allocated, expected {min(copies, reservations)}')
+    if Borrow.objects.count() != len(allocated):
+        errors.append(f'{Borrow.objects.count()} borrow rows for {len(allocated)} allocations')
+    if Reserve.objects.filter(status='Fulfilled').count() != len(allocated):
+        errors.append('fulfilled reservations do not match allocations')
+    edition = Edition.objects.get(isbn=ISBN)
+    if edition.available_copies != Book.objects.filter(isbn=ISBN, status='Available').count():
+        errors.append(f'available_copies counter drifted to {edition.available_copies}')
+
+    return {
+        'requests': len(results),
+        'allocated': len(allocated),
+        'rejected': Counter(r for r in results if not isinstance(r, int)),
+        'seconds': elapsed,
+        'errors': errors,
+    }
+
+
+def borrow_scenario(threads, attempts):
+    book = Book.objects.create(
+        title='Contested', author='Someone', isbn='978-0000000002', status='Available',
+        category='Fiction', shelf_loc='A2',
+    )
+    today = timezone.now().date()
+    reader_ids = list(User.objects.values_list('id', flat=True)[:attempts])
+
+    def borrow(user_id):
+        copy = Book.objects.get(pk=book.pk)
+        try:
+            with transaction.atomic():
+                services.claim_copy(copy)
+                Borrow.objects.create(
+                    user_id=user_id, book=copy, borrow_date=today, due_date=today + timedelta(days=14),
+                )
+            return True
+        except CirculationError:
+            return False
+
+    results, elapsed = run_in_threads(threads, reader_ids, borrow)
+    won = sum(results)
+    errors = [] if won == 1 else [f'{won} readers borrowed the same copy']
+    return {'requests': len(results), 'allocated': won, 'seconds': elapsed, 'errors': errors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--copies', type=int, default=100)
+    parser.add_argument('--reservations', type=int, default=400)
+    args = parser.parse_args()
+
+    db = _django.setup_database(threaded=True)
+    try:
+        report = {
+            'fulfill': fulfill_scenario(args.threads, args.copies, args.reservations),
+            'borrow': borrow_scenario(args.threads, args.reservations),
+        }
+    finally:
+        _django.teardown_database(db)
+
+    failed = False
+    for name, result in report.items():
+        rate = result['requests'] / result['seconds']
+        print(f'{name:<8} {result["requests"]} requests on {args.threads} threads '
+              f'in {result["seconds"]:.2f}s ({rate:.0f} req/s), {result["allocated"]} allocated')
+        for error in result['errors']:
+            failed = True
+            print(f'  FAIL: {error}')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -25,11 +25,8 @@ export interface BookQueryParams {
 
 // 获取图书列表
 export const getBooks = async (params: BookQueryParams): Promise<BookResponse> => {
-  const response = await request.get<Book[]>('/books/', { params });
-  return {
-    results: response.data,
-    count: response.data.length
-  };
+  const response = await request.get<BookResponse>('/books/', { params });
+  return response.data;
 };
 
 // 创建图书
@@ -10,30 +10,14 @@ export const returnBook = async (bookId: number): Promise<void> => {
 };
 
 export const getBorrowings = async (dateRange?: [string, string] | null): Promise<Borrowing[]> => {
-  const params: Record<string, string> = {};
+  // expand=book,user 让后端一次性返回完整的书籍和用户信息
+  const params: Record<string, string> = { expand: 'book,user' };
   if (dateRange) {
     params.start_date = dateRange[0];
     params.end_date = dateRange[1];
   }
-  const response = await request.get('/borrows/', { params });
-  const borrowings = response.data || [];
-
-  // 获取每个借阅记录对应的完整书籍和用户信息
-  const borrowingsWithFullInfo = await Promise.all(
-    borrowings.map(async (borrowing) => {
-      const [bookResponse, userResponse] = await Promise.all([
-        request.get(`/books/${borrowing.book}/`),
-        request.get(`/users/${borrowing.user}/`)
-      ]);
-      return {
-        ...borrowing,
-        book: bookResponse.data,
-        user: userResponse.data
-      };
-    })
-  );
-
-  return borrowingsWithFullInfo;
+  const response = await request.get<{ results: Borrowing[] }>('/borrows/', { params });
+  return response.data.results || [];
 };
 
 export const getBorrowingById = async (id: number): Promise<Borrowing> => {
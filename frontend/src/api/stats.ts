@@ -16,41 +16,42 @@ export interface UserStats {
   borrowedBooks: number;
 }
 
-export const getUserStats = async (userId: string): Promise<UserStats> => {
-  // 获取所有图书
-  const booksResponse = await request.get<Book[]>('/books/');
-  const books = booksResponse.data;
+interface UserStatsResponse {
+  books: { total: number };
+  borrows: { total: number; active: number; overdue: number };
+  reservations: { pending: number };
+}
 
-  // 获取用户的借阅记录
-  const borrowingsResponse = await request.get('/borrows/');
-  const borrowings = borrowingsResponse.data || [];
+interface LibraryStatsResponse {
+  books: { total: number; by_status: Record<Book['status'], number> };
+  users: { total: number; by_role: Record<User['role'], number> };
+  borrows: { total: number; active: number; overdue: number };
+  reservations: { pending: number };
+}
 
-  // 计算当前借阅的图书数量（未归还的借阅记录）
-  const borrowedBooks = borrowings.filter(borrowing => !borrowing.return_date).length;
+export const getUserStats = async (userId: string): Promise<UserStats> => {
+  // 后端聚合统计，无需下载全部记录
+  const response = await request.get<UserStatsResponse>(`/stats/users/${userId}/`);
+  const data = response.data;
 
   return {
-    totalBooks: books.length,
-    borrowedBooks,
+    totalBooks: data.books.total,
+    borrowedBooks: data.borrows.active,
   };
 };
 
 export const getLibraryStats = async (): Promise<LibraryStats> => {
-  // 获取所有图书
-  const booksResponse = await request.get<Book[]>('/books/');
-  const books = booksResponse.data;
-
-  // 获取所有用户
-  const usersResponse = await request.get<User[]>('/users/');
-  const users = usersResponse.data;
+  // 后端聚合统计，无需下载全部记录
+  const response = await request.get<LibraryStatsResponse>('/stats/');
+  const data = response.data;
 
-  // 计算统计数据
   return {
-    totalBooks: books.length,
-    totalUsers: users.length,
-    borrowedBooks: books.filter(book => book.status === 'Borrowed').length,
+    totalBooks: data.books.total,
+    totalUsers: data.users.total,
+    borrowedBooks: data.books.by_status.Borrowed,
     userRoles: {
-      readers: users.filter(user => user.role === 'Reader').length,
-      librarians: users.filter(user => user.role === 'Librarian').length,
+      readers: data.users.by_role.Reader,
+      librarians: data.users.by_role.Librarian,
     },
   };
-};
\ No newline at end of file
+};
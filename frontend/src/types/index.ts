@@ -44,7 +44,9 @@ export interface Reservation {
   user: User;
   reserve_date: string;
   expiry_date: string;
-  status: 'Pending' | 'Fulfilled' | 'Cancelled';
+  status: 'Pending' | 'Ready' | 'Fulfilled' | 'Cancelled' | 'Expired';
+  held_book?: number | null;
+  hold_expires_at?: string | null;
   created_at: string;
   updated_at: string;
 }
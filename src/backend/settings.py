@@ -47,19 +47,28 @@ INSTALLED_APPS = [
     'corsheaders',
 ]
 
+# Render JSON with orjson when it is installed (library.renderers); false
+# keeps DRF's stdlib encoder
+FAST_JSON_RENDERER = os.getenv('FAST_JSON_RENDERER', 'true').lower() == 'true'
+
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'library.renderers.FastJSONRenderer' if FAST_JSON_RENDERER else 'rest_framework.renderers.JSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'library.authentication.StatelessJWTAuthentication',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'library.pagination.StandardPagination',
+    'PAGE_SIZE': int(os.getenv('API_PAGE_SIZE', '20')),
 }
 
+# Upper bound for the client-supplied ?page_size= on list endpoints
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', '100'))
+
 # JWT settings
 from datetime import timedelta
 SIMPLE_JWT = {
@@ -78,7 +87,19 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# Compress responses of at least RESPONSE_COMPRESSION_MIN_BYTES with brotli
+# (if the brotli package is installed) or gzip; turn off when a proxy in
+# front already compresses
+RESPONSE_COMPRESSION = os.getenv('RESPONSE_COMPRESSION', 'true').lower() == 'true'
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESSION_MIN_BYTES', '1024'))
+
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack
+    'library.metrics.RequestMetricsMiddleware',
+    # Picks the database for each request's reads (a no-op without a replica)
+    'library.routers.ReplicaRoutingMiddleware',
+    # Before anything else that reads or changes the response body
+    *(['library.compression.CompressionMiddleware'] if RESPONSE_COMPRESSION else []),
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -111,17 +132,157 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 
 
 # Database
+# Connection reuse: without a pool each thread keeps its connection for
+# DATABASE_CONN_MAX_AGE seconds (0 closes it after every request). With
+# DATABASE_POOL_SIZE > 0 the engine is swapped for its library.db.backends
+# counterpart, which shares up to that many connections among all threads of
+# a process (what ASGI workers need) and returns them after every request.
+DATABASE_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', '0'))
+POOLED_ENGINES = {
+    'django.db.backends.mysql': 'library.db.backends.mysql',
+    'django.db.backends.sqlite3': 'library.db.backends.sqlite3',
+}
+DATABASE_ENGINE = os.getenv('DATABASE_ENGINE', 'django.db.backends.mysql')
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': POOLED_ENGINES[DATABASE_ENGINE] if DATABASE_POOL_SIZE else DATABASE_ENGINE,
         'NAME': os.getenv('DATABASE_NAME', 'library'),
         'USER': os.getenv('DATABASE_USER', 'your_user'),
         'PASSWORD': os.getenv('DATABASE_PASSWORD', 'your_password'),
         'HOST': os.getenv('DATABASE_HOST', 'localhost'),
         'PORT': os.getenv('DATABASE_PORT', '3306'),
+        'CONN_MAX_AGE': 0 if DATABASE_POOL_SIZE else int(os.getenv('DATABASE_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': os.getenv('DATABASE_CONN_HEALTH_CHECKS', 'true').lower() == 'true',
+        'POOL': {
+            'SIZE': DATABASE_POOL_SIZE,
+            'TIMEOUT': float(os.getenv('DATABASE_POOL_TIMEOUT', '10')),
+            'RECYCLE': int(os.getenv('DATABASE_POOL_RECYCLE', '3600')),
+        },
     }
 }
 
+# Read replica (library.routers): set DATABASE_REPLICA_HOST and/or
+# DATABASE_REPLICA_NAME; the other connection settings default to the
+# primary's. Safe reads go to the replica unless the user wrote within
+# DATABASE_REPLICA_STICKY_SECONDS. Tests use the primary for both.
+DATABASE_REPLICA_HOST = os.getenv('DATABASE_REPLICA_HOST', '')
+DATABASE_REPLICA_NAME = os.getenv('DATABASE_REPLICA_NAME', '')
+DATABASE_REPLICA_STICKY_SECONDS = int(os.getenv('DATABASE_REPLICA_STICKY_SECONDS', '10'))
+if DATABASE_REPLICA_HOST or DATABASE_REPLICA_NAME:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': DATABASE_REPLICA_NAME or DATABASES['default']['NAME'],
+        'HOST': DATABASE_REPLICA_HOST or DATABASES['default']['HOST'],
+        'PORT': os.getenv('DATABASE_REPLICA_PORT', DATABASES['default']['PORT']),
+        'USER': os.getenv('DATABASE_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.getenv('DATABASE_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['library.routers.ReplicaRouter']
+
+
+# Cache: 'locmem' (per process, the default and what tests use), 'file'
+# (CACHE_LOCATION is a directory) or 'redis' (CACHE_LOCATION is a redis:// URL)
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[os.getenv('CACHE_BACKEND', 'locmem')],
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Seconds a cached book/review response is kept; writes invalidate it sooner
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '300'))
+
+# JWT authentication (library.authentication): size and lifetime (seconds)
+# of the per-process user cache, and seconds the token deny-list is cached
+AUTH_USER_CACHE_SIZE = int(os.getenv('AUTH_USER_CACHE_SIZE', '1024'))
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', '60'))
+AUTH_DENYLIST_TTL = int(os.getenv('AUTH_DENYLIST_TTL', '30'))
+
+# Seconds that /api/stats/ results are served from cache
+STATS_CACHE_TTL = int(os.getenv('STATS_CACHE_TTL', '30'))
+
+# Changes feed (library.changes): most changes per page, seconds recent
+# changes are held back for in-flight transactions, and days tombstones
+# (and so since tokens) are kept
+CHANGES_PAGE_SIZE = int(os.getenv('CHANGES_PAGE_SIZE', '500'))
+CHANGES_SETTLE_SECONDS = int(os.getenv('CHANGES_SETTLE_SECONDS', '2'))
+CHANGES_RETENTION_DAYS = int(os.getenv('CHANGES_RETENTION_DAYS', '30'))
+
+# Seconds that /api/books/availability/ results are served from cache
+AVAILABILITY_CACHE_TTL = int(os.getenv('AVAILABILITY_CACHE_TTL', '5'))
+
+# manage.py archive_borrows: loans returned more than this many months ago
+# move to the archive table, this many per transaction
+BORROW_ARCHIVE_MONTHS = int(os.getenv('BORROW_ARCHIVE_MONTHS', '12'))
+BORROW_ARCHIVE_BATCH_SIZE = int(os.getenv('BORROW_ARCHIVE_BATCH_SIZE', '1000'))
+
+
+# Serve the hottest reads from library.async_views (use with an ASGI server;
+# src/gunicorn.conf.py turns it on for SERVER_MODE=asgi)
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'false').lower() == 'true'
+
+
+# Catalog search: 'fulltext' (MySQL FULLTEXT), 'memory' (in-process inverted
+# index) or 'auto' to pick FULLTEXT whenever the database is MySQL. With
+# several processes, 'memory' needs CACHE_BACKEND=file or redis to see the
+# other processes' catalog writes
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto')
+
+
+# Fraction of requests timed by library.metrics (0 disables, 1 records all),
+# and the token a scraper sends as "Authorization: Token <METRICS_TOKEN>"
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', '1.0'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+
+# Notification sinks used by manage.py run_outbox_worker (comma-separated
+# dotted paths), the file written by library.outbox.FileSink, and days
+# delivered events are kept before manage.py prune_outbox deletes them
+OUTBOX_SINKS = os.getenv('OUTBOX_SINKS', 'library.outbox.ConsoleSink').split(',')
+OUTBOX_FILE_PATH = os.getenv('OUTBOX_FILE_PATH', str(BASE_DIR / 'outbox.jsonl'))
+OUTBOX_RETENTION_DAYS = int(os.getenv('OUTBOX_RETENTION_DAYS', '7'))
+
+
+# Rows per bulk write for catalog imports (manage.py import_catalog, /api/books/import/)
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '1000'))
+
+# Most items accepted by one bulk checkout/return call (/api/borrows/bulk_*)
+CIRCULATION_BULK_LIMIT = int(os.getenv('CIRCULATION_BULK_LIMIT', '500'))
+
+
+# Password hashing: PASSWORD_HASHER ('scrypt', 'argon2' or 'pbkdf2') hashes
+# new passwords and re-hashes old ones at their next login. 'argon2' needs
+# the argon2-cffi package. The cost parameters below are the defaults.
+PASSWORD_HASHER_CLASSES = {
+    'scrypt': 'library.hashers.ScryptPasswordHasher',
+    'argon2': 'library.hashers.Argon2PasswordHasher',
+    'pbkdf2': 'library.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'scrypt')
+PASSWORD_HASHERS = [PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]] + [
+    path for name, path in PASSWORD_HASHER_CLASSES.items() if name != PASSWORD_HASHER
+]
+PASSWORD_SCRYPT_WORK_FACTOR = int(os.getenv('PASSWORD_SCRYPT_WORK_FACTOR', str(2 ** 14)))
+PASSWORD_SCRYPT_BLOCK_SIZE = int(os.getenv('PASSWORD_SCRYPT_BLOCK_SIZE', '8'))
+PASSWORD_SCRYPT_PARALLELISM = int(os.getenv('PASSWORD_SCRYPT_PARALLELISM', '1'))
+PASSWORD_ARGON2_TIME_COST = int(os.getenv('PASSWORD_ARGON2_TIME_COST', '2'))
+PASSWORD_ARGON2_MEMORY_COST = int(os.getenv('PASSWORD_ARGON2_MEMORY_COST', '19456'))  # KiB
+PASSWORD_ARGON2_PARALLELISM = int(os.getenv('PASSWORD_ARGON2_PARALLELISM', '1'))
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', '870000'))
+
+# Login attempts per client IP and per email: (burst, refills per minute)
+LOGIN_THROTTLE_RATES = {
+    'ip': (int(os.getenv('LOGIN_IP_BURST', '50')), float(os.getenv('LOGIN_IP_PER_MINUTE', '30'))),
+    'email': (int(os.getenv('LOGIN_EMAIL_BURST', '5')), float(os.getenv('LOGIN_EMAIL_PER_MINUTE', '6'))),
+}
+
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
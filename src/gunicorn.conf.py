@@ -0,0 +1,45 @@
+"""
+Production server settings:
+
+    gunicorn -c src/gunicorn.conf.py
+
+SERVER_MODE=asgi (the default) runs uvicorn workers on backend.asgi and
+turns on the async read views (ASYNC_VIEWS) and the connection pool
+(DATABASE_POOL_SIZE); SERVER_MODE=wsgi runs threaded sync workers on
+backend.wsgi with persistent connections.
+"""
+import multiprocessing
+import os
+
+mode = os.getenv('SERVER_MODE', 'asgi')
+if mode == 'asgi':
+    os.environ.setdefault('ASYNC_VIEWS', 'true')
+    # Requests don't keep a thread, so per-thread persistent connections can't be reused
+    os.environ.setdefault('DATABASE_POOL_SIZE', '10')
+    wsgi_app = 'backend.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+elif mode == 'wsgi':
+    wsgi_app = 'backend.wsgi:application'
+    worker_class = 'gthread'
+    threads = int(os.getenv('SERVER_THREADS', '4'))
+else:
+    raise ValueError(f"SERVER_MODE must be 'asgi' or 'wsgi', not {mode!r}")
+
+# Import the project from src/ wherever gunicorn is started
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = os.getenv('SERVER_BIND', '0.0.0.0:8000')
+# Response cache versions, the replica sticky window and the search index
+# version are coordinated through the Django cache. A locmem cache is per
+# process, so several workers need CACHE_BACKEND=file or redis.
+shared_cache = os.getenv('CACHE_BACKEND', 'locmem') != 'locmem'
+workers = int(os.getenv('SERVER_WORKERS', str(multiprocessing.cpu_count() * 2 + 1 if shared_cache else 1)))
+if workers > 1 and not shared_cache:
+    raise ValueError(
+        f'SERVER_WORKERS={workers} needs a cache shared by the workers: set CACHE_BACKEND to file or redis')
+timeout = int(os.getenv('SERVER_TIMEOUT', '30'))
+graceful_timeout = timeout
+keepalive = 5
+# Recycle workers now and then so slow leaks can't build up
+max_requests = int(os.getenv('SERVER_MAX_REQUESTS', '1000'))
+max_requests_jitter = max_requests // 10
+accesslog = '-'
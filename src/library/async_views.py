@@ -0,0 +1,310 @@
+"""
+Async versions of the hottest read endpoints, for ASGI servers.
+
+With ASYNC_VIEWS on, library.urls routes the catalog list and detail,
+my_borrows, my_reservations, my_reviews and the stats endpoints here ahead
+of the DRF views. They read through Django's async ORM (``aget``, ``async
+for``) and async cache API, so a worker keeps serving other requests while
+one waits on the database, the cache or a slow client. Bodies match the DRF views: same serializers,
+JSON renderer, pagination envelope and response cache entries. Anything
+these views don't cover (writes, search, cursor paging, the browsable API)
+is handed to the DRF view for the same URL.
+"""
+import math
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.http import HttpResponse
+from django.urls import path
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from . import caching, views
+from .authentication import StatelessJWTAuthentication
+from .models import User, Book, Borrow, ArchivedBorrow, Reserve, Review
+from .pagination import StandardPagination
+from .renderers import FastJSONRenderer
+
+renderer = FastJSONRenderer() if settings.FAST_JSON_RENDERER else JSONRenderer()
+authenticator = StatelessJWTAuthentication()
+
+
+def json_response(data, status_code=status.HTTP_200_OK, **headers):
+    response = HttpResponse(renderer.render(data), status=status_code, content_type=renderer.media_type)
+    response['Vary'] = 'Accept'
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def error_response(exc):
+    # Same body and status as DRF's exception handler
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    headers = {}
+    if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+        headers['WWW-Authenticate'] = authenticator.authenticate_header(None)
+    return json_response(data, exc.status_code, **headers)
+
+
+def wants_json(request):
+    # The browsable API (HTML) and other formats stay with DRF
+    return request.GET.get('format', 'json') == 'json' and 'text/html' not in request.headers.get('Accept', '')
+
+
+def async_read(fast_path_params=None):
+    """
+    Serve GET requests with the decorated async view and hand everything
+    else to the DRF view passed in as ``fallback``. With fast_path_params,
+    requests using any other query parameter are handed over too.
+    """
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, fallback, **kwargs):
+            eligible = request.method == 'GET' and wants_json(request)
+            if eligible and fast_path_params is not None:
+                eligible = set(request.GET) <= set(fast_path_params)
+            if not eligible:
+                return await sync_to_async(fallback)(request, **kwargs)
+            try:
+                request.user = await authenticate(request)
+                return await view(request, **kwargs)
+            except exceptions.APIException as exc:
+                return error_response(exc)
+        return wrapper
+    return decorator
+
+
+async def authenticate(request):
+    # Like DRF, a bad token is rejected even on endpoints open to anonymous users
+    result = await authenticator.aauthenticate(request)
+    return result[0] if result else AnonymousUser()
+
+
+def require_user(request):
+    if not request.user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+
+
+def expand_fields(request, allowed):
+    requested = request.GET.get('expand', '')
+    return [name for name in dict.fromkeys(part.strip() for part in requested.split(',')) if name in allowed]
+
+
+def sparse_fields(request):
+    # views.list_param() for ?fields=, read from a plain Django request
+    return list(dict.fromkeys(
+        item.strip() for value in request.GET.getlist('fields') for item in value.split(',') if item.strip()
+    ))
+
+
+async def paginate(request, queryset, serialize):
+    # Page-number envelope of StandardPagination: {count, next, previous, results}
+    paginator = StandardPagination()
+    page_size = paginator.get_page_size(Request(request))
+    count = await queryset.acount()
+    pages = max(1, math.ceil(count / page_size))
+    page = request.GET.get(paginator.page_query_param, 1)
+    try:
+        number = pages if page in paginator.last_page_strings else int(page)
+    except (TypeError, ValueError):
+        number = 0
+    if not 1 <= number <= pages:
+        raise exceptions.NotFound(paginator.invalid_page_message.format(page_number=page, message=''))
+
+    offset = (number - 1) * page_size
+    rows = [row async for row in queryset[offset:offset + page_size]]
+    url = request.build_absolute_uri()
+    previous = None
+    if number > 1:
+        previous = (remove_query_param(url, paginator.page_query_param) if number == 2
+                    else replace_query_param(url, paginator.page_query_param, number - 1))
+    return {
+        'count': count,
+        'next': replace_query_param(url, paginator.page_query_param, number + 1) if number < pages else None,
+        'previous': previous,
+        'results': serialize(rows),
+    }
+
+
+async def cached(request, name, resources, build):
+    # Async counterpart of caching.CachedResponseMixin, sharing its entries
+    etag, last_modified, key = await caching.avalidators(request, name, resources)
+    if caching.not_modified(request, etag, last_modified):
+        return caching.set_validators(HttpResponse(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
+
+    data = await cache.aget(key)
+    if data is not None:
+        await caching.arecord(name, 'hit')
+        response = json_response(data, **{'X-Cache': 'HIT'})
+    else:
+        await caching.arecord(name, 'miss')
+        data = await build()
+        await cache.aset(key, data, settings.RESPONSE_CACHE_TTL)
+        response = json_response(data, **{'X-Cache': 'MISS'})
+    return caching.set_validators(response, etag, last_modified)
+
+
+# -------------------------------
+# Catalog
+# -------------------------------
+
+BOOK_PARAMS = ('page', 'page_size', 'status', 'category', 'expand', 'fields', 'format')
+
+
+@async_read(fast_path_params=BOOK_PARAMS)
+async def book_list(request):
+    expand = expand_fields(request, views.BookViewSet.expandable)
+    context = {'expand': expand, 'fields': sparse_fields(request)}
+    queryset = Book.objects.select_related(*expand).order_by('book_id')
+    if request.GET.get('status'):
+        queryset = queryset.filter(status=request.GET['status'])
+    if request.GET.get('category'):
+        queryset = queryset.filter(category=request.GET['category'])
+
+    def serialize(rows):
+        return views.BookSerializer(rows, many=True, context=context).data
+
+    # Expanded editions carry rating totals, which move with reviews
+    resources = ('book', 'review') if expand else ('book',)
+    return await cached(request, 'book-list', resources, lambda: paginate(request, queryset, serialize))
+
+
+@async_read(fast_path_params=('expand', 'fields', 'format'))
+async def book_detail(request, pk):
+    expand = expand_fields(request, views.BookViewSet.expandable)
+    context = {'expand': expand, 'fields': sparse_fields(request)}
+
+    async def build():
+        try:
+            book = await Book.objects.select_related(*expand).aget(pk=pk)
+        except Book.DoesNotExist:
+            raise exceptions.NotFound('No Book matches the given query.')
+        return views.BookSerializer(book, context=context).data
+
+    resources = ('book', 'review') if expand else ('book',)
+    return await cached(request, 'book-retrieve', resources, build)
+
+
+# -------------------------------
+# A reader's own records
+# -------------------------------
+
+# Cursor paging (?paging=cursor, ?cursor=) is left to DRF
+OWN_PARAMS = ('page', 'page_size', 'expand', 'fields', 'format')
+
+
+async def own_records(request, model, viewset, ordering):
+    require_user(request)
+    expand = expand_fields(request, viewset.expandable)
+    context = {'expand': expand, 'fields': sparse_fields(request)}
+    queryset = model.objects.filter(user=request.user).select_related(*expand).order_by(*ordering)
+
+    def serialize(rows):
+        return viewset.serializer_class(rows, many=True, context=context).data
+
+    return json_response(await paginate(request, queryset, serialize))
+
+
+@async_read(fast_path_params=OWN_PARAMS)
+async def my_borrows(request):
+    return await own_records(request, Borrow, views.BorrowViewSet, ('-borrow_date', '-borrow_id'))
+
+
+@async_read(fast_path_params=OWN_PARAMS)
+async def my_reservations(request):
+    return await own_records(request, Reserve, views.ReserveViewSet, ('-reserve_date', '-reserve_id'))
+
+
+@async_read(fast_path_params=OWN_PARAMS)
+async def my_reviews(request):
+    return await own_records(request, Review, views.ReviewViewSet, ('-review_date', '-review_id'))
+
+
+# -------------------------------
+# Dashboard statistics
+# -------------------------------
+
+async def count_by(queryset, field, choices):
+    counts = {value: 0 for value, _ in choices}
+    async for row in queryset.values(field).annotate(n=Count('pk')).order_by():
+        counts[row[field]] = row['n']
+    return counts
+
+
+async def borrow_counts(**filters):
+    # views._borrow_counts(): archived loans only add to the total
+    today = timezone.now().date()
+    counts = await Borrow.objects.filter(**filters).aaggregate(
+        total=Count('borrow_id'),
+        active=Count('borrow_id', filter=Q(return_date__isnull=True)),
+        overdue=Count('borrow_id', filter=Q(return_date__isnull=True, due_date__lt=today)),
+    )
+    counts['total'] += await ArchivedBorrow.objects.filter(**filters).acount()
+    return counts
+
+
+@async_read()
+async def library_stats(request):
+    require_user(request)
+    cache_key = 'library:stats'
+    data = await cache.aget(cache_key)
+    if data is None:
+        books_by_status = await count_by(Book.objects.all(), 'status', Book.STATUS_CHOICES)
+        users_by_role = await count_by(User.objects.all(), 'role', User.ROLE_CHOICES)
+        data = {
+            "books": {"total": sum(books_by_status.values()), "by_status": books_by_status},
+            "users": {"total": sum(users_by_role.values()), "by_role": users_by_role},
+            "borrows": await borrow_counts(),
+            "reservations": {"pending": await Reserve.objects.filter(status='Pending').acount()},
+        }
+        await cache.aset(cache_key, data, settings.STATS_CACHE_TTL)
+    return json_response(data)
+
+
+@async_read()
+async def user_stats(request, user_id):
+    require_user(request)
+    if request.user.role != 'Librarian' and request.user.pk != user_id:
+        raise exceptions.PermissionDenied("You can only view your own statistics.")
+
+    cache_key = f'library:stats:user:{user_id}'
+    data = await cache.aget(cache_key)
+    if data is None:
+        data = {
+            "user_id": user_id,
+            "books": {"total": await Book.objects.acount()},
+            "borrows": await borrow_counts(user_id=user_id),
+            "reservations": {
+                "pending": await Reserve.objects.filter(user_id=user_id, status='Pending').acount()
+            },
+        }
+        await cache.aset(cache_key, data, settings.STATS_CACHE_TTL)
+    return json_response(data)
+
+
+def urlpatterns(router):
+    # Routes for library.urls, named like the DRF routes they stand in for
+    fallbacks = {url.name: url.callback for url in router.urls if url.name}
+    fallbacks.update({'stats': views.library_stats, 'user-stats': views.user_stats})
+
+    def route(pattern, view, name):
+        return path(pattern, view, {'fallback': fallbacks[name]}, name=name)
+
+    return [
+        route('books/', book_list, 'book-list'),
+        route('books/<int:pk>/', book_detail, 'book-detail'),
+        route('borrows/my_borrows/', my_borrows, 'borrow-my-borrows'),
+        route('reserves/my_reservations/', my_reservations, 'reserve-my-reservations'),
+        route('reviews/my_reviews/', my_reviews, 'review-my-reviews'),
+        route('stats/', library_stats, 'stats'),
+        route('stats/users/<int:user_id>/', user_stats, 'user-stats'),
+    ]
@@ -0,0 +1,212 @@
+"""
+Stateless JWT authentication.
+
+Tokens from issue_tokens() carry the user's role, email and library card id
+as claims, so StatelessJWTAuthentication builds request.user (a TokenUser)
+from the verified token without loading the User row. Other columns load
+on first access through a small per-process LRU cache whose entries live
+AUTH_USER_CACHE_TTL seconds.
+
+Revocations (logout, role/email/active changes) are TokenRevocation rows.
+The unexpired ones are kept as a deny-list in the Django cache for
+AUTH_DENYLIST_TTL seconds; with a per-process cache (locmem) other workers
+honour a revocation within that many seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import User, LibraryCard, TokenUser, TokenRevocation
+
+DENYLIST_KEY = 'library:auth:denylist'
+
+# User columns carried as token claims; changing one revokes the user's tokens
+CLAIM_FIELDS = ('email', 'role')
+
+
+class TTLCache:
+    # Thread-safe LRU of at most maxsize loaded values, each kept ttl seconds
+    def __init__(self, maxsize, ttl, load):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.load = load
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+        value = self.load(key)
+        if value is not None:
+            with self._lock:
+                self._entries[key] = (now + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return value
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = TTLCache(
+    settings.AUTH_USER_CACHE_SIZE, settings.AUTH_USER_CACHE_TTL,
+    lambda pk: User.objects.filter(pk=pk).first(),
+)
+
+
+def issue_tokens(user):
+    # Refresh/access pair with the claims StatelessJWTAuthentication reads
+    refresh = RefreshToken.for_user(user)
+    for field in CLAIM_FIELDS:
+        refresh[field] = getattr(user, field)
+    refresh['card_id'] = LibraryCard.objects.filter(user=user).values_list('card_id', flat=True).first()
+    return {
+        "refresh": str(refresh),
+        "access": str(refresh.access_token),
+    }
+
+
+# -------------------------------
+# Revocation
+# -------------------------------
+
+def denylist():
+    # (revoked jtis, {user id claim: tokens issued up to this timestamp are revoked})
+    entries = cache.get(DENYLIST_KEY)
+    if entries is None:
+        jtis, users = set(), {}
+        rows = TokenRevocation.objects.filter(expires_at__gt=timezone.now())
+        for jti, user_id, created_at in rows.values_list('jti', 'user_id', 'created_at'):
+            if jti:
+                jtis.add(jti)
+            else:
+                # Whole seconds like "iat"; a token from the same second counts
+                # as issued before (at worst the client logs in again)
+                users[str(user_id)] = max(users.get(str(user_id), 0), int(created_at.timestamp()))
+        entries = (jtis, users)
+        cache.set(DENYLIST_KEY, entries, settings.AUTH_DENYLIST_TTL)
+    return entries
+
+
+def is_revoked(token):
+    return _revoked(token, denylist())
+
+
+async def ais_revoked(token):
+    # The shared (file or redis) cache does blocking I/O, so keep it off the loop
+    entries = await cache.aget(DENYLIST_KEY)
+    if entries is None:
+        entries = await sync_to_async(denylist)()
+    return _revoked(token, entries)
+
+
+def _revoked(token, entries):
+    jtis, users = entries
+    if token.get(api_settings.JTI_CLAIM) in jtis:
+        return True
+    cutoff = users.get(str(token.get(api_settings.USER_ID_CLAIM)))
+    return cutoff is not None and token.get('iat', 0) <= cutoff
+
+
+def revoke_token(token):
+    # Deny one validated token until it would have expired anyway
+    _revoke(
+        jti=token[api_settings.JTI_CLAIM],
+        user_id=token.get(api_settings.USER_ID_CLAIM),
+        expires_at=datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc),
+    )
+
+
+def revoke_user(user_id):
+    # Deny every token issued to the user so far
+    _revoke(jti='', user_id=user_id, expires_at=timezone.now() + api_settings.REFRESH_TOKEN_LIFETIME)
+
+
+def _revoke(**fields):
+    now = timezone.now()
+    TokenRevocation.objects.filter(expires_at__lte=now).delete()
+    TokenRevocation.objects.create(created_at=now, **fields)
+    transaction.on_commit(lambda: cache.delete(DENYLIST_KEY))
+
+
+# -------------------------------
+# Authentication class
+# -------------------------------
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        user_id = self._user_id(validated_token)
+        if is_revoked(validated_token):
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+        if self._has_claims(validated_token):
+            return self._token_user(validated_token, user_id)
+        return self._full_user(user_cache.get(user_id))
+
+    async def aauthenticate(self, request):
+        # authenticate() for plain Django async views
+        header = self.get_header(request)
+        raw_token = self.get_raw_token(header) if header is not None else None
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = self._user_id(validated_token)
+        if await ais_revoked(validated_token):
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+        if self._has_claims(validated_token):
+            return self._token_user(validated_token, user_id)
+        return self._full_user(await sync_to_async(user_cache.get)(user_id))
+
+    @staticmethod
+    def _user_id(validated_token):
+        try:
+            # The claim is a string; the model wants its own pk type
+            return User._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    @staticmethod
+    def _has_claims(validated_token):
+        # Tokens issued before the claims were added carry only the user id
+        return all(field in validated_token for field in CLAIM_FIELDS)
+
+    @staticmethod
+    def _token_user(validated_token, user_id):
+        values = {'id': user_id, **{field: validated_token[field] for field in CLAIM_FIELDS}}
+        names = [f.attname for f in TokenUser._meta.concrete_fields if f.attname in values]
+        user = TokenUser.from_db(router.db_for_read(TokenUser), names, [values[name] for name in names])
+        user.card_id = validated_token.get('card_id')
+        return user
+
+    @staticmethod
+    def _full_user(user):
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
@@ -0,0 +1,185 @@
+"""
+Streaming catalog import/export.
+
+Imports read CSV or JSONL one row at a time, validate each chunk with
+BookSerializer and write it with bulk_create/bulk_update, collecting
+per-row errors instead of aborting. Exports read the table in primary key
+order, one bounded batch per query, so neither direction holds a whole
+table in memory.
+"""
+import csv
+import io
+import json
+from itertools import islice
+
+from django.db import transaction
+
+from .models import Edition, Book, Borrow, Review
+from .serializers import BookSerializer
+from . import caching, search
+
+FORMATS = ('csv', 'jsonl')
+
+EXPORT_MODELS = {
+    'books': Book,
+    'borrows': Borrow,
+    'reviews': Review,
+}
+
+BOOK_FIELDS = ['author', 'title', 'isbn', 'status', 'category', 'shelf_loc']
+
+# Per-row errors kept in a report; the counts are always complete
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+        # Why the import stopped early (e.g. the file is not UTF-8), if it did
+        self.error = None
+
+    def add_error(self, row_number, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+            **({'error': self.error} if self.error else {}),
+        }
+
+
+def read_rows(stream, file_format):
+    """
+    Yield (row_number, dict) from a text stream without reading it all.
+    Malformed JSONL lines are yielded as (row_number, None).
+    """
+    if file_format == 'csv':
+        for number, row in enumerate(csv.DictReader(stream), start=1):
+            yield number, row
+    elif file_format == 'jsonl':
+        for number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield number, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f"Unsupported format '{file_format}', expected one of {', '.join(FORMATS)}")
+
+
+def text_stream(binary_file):
+    # Uploaded files and sys.stdin.buffer are bytes; the readers want text
+    return io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+
+
+def _import_chunk(chunk, report):
+    # Rows carrying an existing book_id update that copy; the rest are new copies
+    ids = {row.get('book_id') for _, row in chunk if row and row.get('book_id')}
+    existing = Book.objects.in_bulk([i for i in ids if str(i).isdigit()])
+
+    to_create, to_update, touched_isbns = [], [], set()
+    for number, row in chunk:
+        if row is None:
+            report.add_error(number, {'non_field_errors': ['Row is not a JSON object.']})
+            continue
+        instance = existing.get(int(row['book_id'])) if str(row.get('book_id') or '').isdigit() else None
+        serializer = BookSerializer(instance, data=row, partial=instance is not None)
+        if not serializer.is_valid():
+            report.add_error(number, serializer.errors)
+            continue
+
+        book = instance or Book()
+        old_isbn = book.isbn
+        for field, value in serializer.validated_data.items():
+            setattr(book, field, value)
+        if instance is None or book.isbn != old_isbn:
+            # Relinked by Edition.objects.sync() below
+            book.edition = None
+        touched_isbns.update({old_isbn, book.isbn} - {''})
+        (to_update if instance is not None else to_create).append(book)
+
+    with transaction.atomic():
+        Book.objects.bulk_create(to_create)
+        Book.objects.bulk_update(to_update, BOOK_FIELDS + ['edition'])
+        # bulk writes skip save(): link editions and recount them in bulk
+        Edition.objects.sync(isbns=touched_isbns)
+
+    report.created += len(to_create)
+    report.updated += len(to_update)
+
+
+def import_books(rows, batch_size=1000):
+    """
+    Import (row_number, dict) pairs from read_rows() in chunks of
+    ``batch_size``. Returns an ImportReport.
+    """
+    report = ImportReport()
+    rows = iter(rows)
+    last_row = 0
+    while report.error is None:
+        chunk = []
+        try:
+            for number, row in islice(rows, batch_size):
+                chunk.append((number, row))
+                last_row = number
+        except UnicodeDecodeError:
+            # Keep what was read; the rest of the file can't be decoded
+            report.error = f'The file is not valid UTF-8 after row {last_row}; the rest was not imported.'
+        if not chunk:
+            break
+        _import_chunk(chunk, report)
+    if report.created or report.updated:
+        search.index.invalidate()
+        caching.touch('book')
+    return report
+
+
+class _Echo:
+    # csv.writer target that hands each formatted line straight back
+    def write(self, value):
+        return value
+
+
+def _keyset_rows(queryset, chunk_size):
+    # Seek past the last primary key instead of holding a cursor open:
+    # mysqlclient buffers a whole result set in client memory, even with iterator()
+    last = None
+    while True:
+        batch = list((queryset if last is None else queryset.filter(pk__gt=last))[:chunk_size])
+        yield from batch
+        if len(batch) < chunk_size:
+            return
+        last = batch[-1][0]
+
+
+def export_rows(model, file_format, chunk_size=2000):
+    """
+    Yield the table as CSV or JSONL text, one row at a time, reading
+    chunk_size rows per query by primary key.
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Unsupported format '{file_format}', expected one of {', '.join(FORMATS)}")
+
+    meta = model._meta
+    columns = [meta.pk.attname] + [f.attname for f in meta.concrete_fields if not f.primary_key]
+    rows = _keyset_rows(model.objects.order_by('pk').values_list(*columns), chunk_size)
+
+    if file_format == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow(row)
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(columns, row)), default=str) + '\n'
@@ -0,0 +1,181 @@
+"""
+Response cache for read-heavy catalog endpoints.
+
+Each cached resource ('book', 'review', ...) has a version stamp in the
+cache: the time in milliseconds of its last change. Cache keys and ETags
+include the stamps of every resource a response depends on, so bumping a
+stamp (from model signals, or from code that writes with QuerySet.update)
+invalidates exactly the affected responses. Old entries simply age out.
+"""
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import routers
+
+VERSION_KEY = 'library:cache:version:{}'
+STATS_KEY = 'library:cache:stats:{}:{}'
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def touch(*resources):
+    # Mark resources as changed once the current transaction commits, so a
+    # concurrent reader can't cache pre-commit data under the new version
+    def bump():
+        stamp = _now_ms()
+        for resource in resources:
+            key = VERSION_KEY.format(resource)
+            if cache.get(key) == stamp:
+                stamp += 1
+            cache.set(key, stamp, None)
+
+    transaction.on_commit(bump)
+
+
+def versions(resources):
+    keys = {resource: VERSION_KEY.format(resource) for resource in resources}
+    found = cache.get_many(keys.values())
+    result = {}
+    for resource, key in keys.items():
+        if key not in found:
+            # Unknown (cold or evicted cache): start a fresh version now
+            found[key] = _now_ms()
+            cache.add(key, found[key], None)
+        result[resource] = found[key]
+    return result
+
+
+async def aversions(resources):
+    # versions() for async views, without blocking the event loop on the cache
+    keys = {resource: VERSION_KEY.format(resource) for resource in resources}
+    found = await cache.aget_many(keys.values())
+    result = {}
+    for resource, key in keys.items():
+        if key not in found:
+            found[key] = _now_ms()
+            await cache.aadd(key, found[key], None)
+        result[resource] = found[key]
+    return result
+
+
+def record(name, outcome):
+    key = STATS_KEY.format(name, outcome)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+async def arecord(name, outcome):
+    key = STATS_KEY.format(name, outcome)
+    if not await cache.aadd(key, 1, None):
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            await cache.aset(key, 1, None)
+
+
+def stats(names):
+    # {name: {'hits': n, 'misses': n}} for the given cache names
+    keys = {(name, outcome): STATS_KEY.format(name, outcome) for name in names for outcome in ('hit', 'miss')}
+    found = cache.get_many(keys.values())
+    return {
+        name: {
+            'hits': found.get(keys[(name, 'hit')], 0),
+            'misses': found.get(keys[(name, 'miss')], 0),
+        }
+        for name in names
+    }
+
+
+def validators(request, name, resources):
+    # (ETag, Last-Modified, cache key) of a response under the current versions
+    return _validators(request, name, versions(resources))
+
+
+async def avalidators(request, name, resources):
+    return _validators(request, name, await aversions(resources))
+
+
+def _validators(request, name, stamps):
+    if _now_ms() - max(stamps.values(), default=0) < settings.DATABASE_REPLICA_STICKY_SECONDS * 1000:
+        # Just changed: a replica may lag behind, and what is built now gets cached
+        routers.use_primary()
+    version = '-'.join(str(stamps[resource]) for resource in sorted(stamps))
+    # Pagination links are absolute, so the host is part of the key
+    digest = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+    etag = f'W/"{version}-{digest[:16]}"'
+    last_modified = max(stamps.values(), default=_now_ms()) // 1000
+    return etag, last_modified, f'library:cache:response:{name}:{version}:{digest}'
+
+
+def not_modified(request, etag, last_modified):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        return etag in (tag.strip() for tag in if_none_match.split(',')) or if_none_match.strip() == '*'
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and last_modified <= if_modified_since
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Clients may keep a copy but must revalidate it with us
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+class CachedResponseMixin:
+    """
+    ViewSet mixin caching the serialized data of list/retrieve responses
+    and answering conditional requests (If-None-Match / If-Modified-Since)
+    with 304. Responses must not depend on who is asking.
+    """
+    cache_resources = ()
+    cached_actions = ('list', 'retrieve')
+
+    def get_cache_resources(self):
+        return self.cache_resources
+
+    def get_cache_name(self):
+        return f'{self.basename}-{self.action}'
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Wrap the handler dispatch is about to call, so subclasses can keep
+        # overriding list()/retrieve() as usual. Only JSON GETs are cached.
+        if (request.method == 'GET' and self.action in self.cached_actions
+                and request.accepted_renderer.format == 'json'):
+            self.get = functools.partial(self._cached_response, getattr(self, self.action))
+
+    def _cached_response(self, handler, request, *args, **kwargs):
+        etag, last_modified, key = validators(request, self.get_cache_name(), self.get_cache_resources())
+
+        if not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = cache.get(key)
+            if data is not None:
+                record(self.get_cache_name(), 'hit')
+                response = Response(data)
+                response['X-Cache'] = 'HIT'
+            else:
+                record(self.get_cache_name(), 'miss')
+                response = handler(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(key, response.data, settings.RESPONSE_CACHE_TTL)
+                response['X-Cache'] = 'MISS'
+
+        return set_validators(response, etag, last_modified)
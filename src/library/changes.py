@@ -0,0 +1,139 @@
+"""
+Changes feed: rows of Book, Borrow, Reserve and Review created, modified or
+deleted after a cursor, for clients that keep a local copy.
+
+All changes are ordered by (time, kind, id), using updated_at for live
+rows and deleted_at for Tombstones. The cursor (the ``next`` token of a
+page) is that key for the last change served, or the settle horizon once
+the client has caught up, base64-encoded so clients treat it as opaque.
+Rows changed in the last CHANGES_SETTLE_SECONDS are held back, so that a
+transaction that stamped its rows earlier but committed later is not
+skipped. Transactions longer than that can still be missed.
+
+Tombstones are kept for CHANGES_RETENTION_DAYS. A token also carries the
+time its client was last caught up (or started syncing). When that time is
+older than the retention window, deletions may have been pruned, so the
+token gets 410 and the client has to sync again from the start. A quiet
+feed doesn't expire tokens: each caught-up poll renews them.
+"""
+import base64
+import heapq
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Book, Borrow, Reserve, Review, Tombstone
+from .serializers import BookSerializer, BorrowSerializer, ReserveSerializer, ReviewSerializer
+
+# (kind, model, serializer); the position is part of the sort key, so only append
+KINDS = (
+    ('book', Book, BookSerializer),
+    ('borrow', Borrow, BorrowSerializer),
+    ('reserve', Reserve, ReserveSerializer),
+    ('review', Review, ReviewSerializer),
+)
+TOMBSTONE_RANK = len(KINDS)
+# Kinds that belong to one user: readers only get their own
+PRIVATE_KINDS = ('borrow', 'reserve')
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class ExpiredToken(Exception):
+    pass
+
+
+def encode_token(key, synced):
+    moment, rank, pk = key
+    raw = json.dumps([moment.isoformat(), rank, pk, synced.isoformat()], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_token(token):
+    # (cursor key, time the client was last caught up)
+    try:
+        moment, rank, pk, *synced = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        moment = datetime.fromisoformat(moment)
+        # Tokens issued before they carried a sync time: the cursor time is the best guess
+        synced = datetime.fromisoformat(synced[0]) if synced else moment
+        return (moment, int(rank), int(pk)), synced
+    except (ValueError, TypeError, IndexError):
+        raise InvalidToken()
+
+
+def after(queryset, field, rank, cursor):
+    # Rows of the source at position rank that sort after cursor
+    if cursor is None:
+        return queryset
+    moment, cursor_rank, pk = cursor
+    if rank < cursor_rank:
+        return queryset.filter(**{f'{field}__gt': moment})
+    if rank > cursor_rank:
+        return queryset.filter(**{f'{field}__gte': moment})
+    return queryset.filter(Q(**{f'{field}__gt': moment}) | Q(**{field: moment, 'pk__gt': pk}))
+
+
+def visible_kinds(user, kinds):
+    if user.is_authenticated:
+        return kinds
+    return [kind for kind in kinds if kind not in PRIVATE_KINDS]
+
+
+def changes(user, token=None, kinds=None, limit=None):
+    """
+    One page of changes after token: {"changes": [...], "next": token,
+    "has_more": bool}. Each change is {"kind", "id", "deleted", "data"}.
+    """
+    now = timezone.now()
+    cursor, synced = decode_token(token) if token else (None, now)
+    if synced < now - timedelta(days=settings.CHANGES_RETENTION_DAYS):
+        raise ExpiredToken()
+    limit = min(limit or settings.CHANGES_PAGE_SIZE, settings.CHANGES_PAGE_SIZE)
+    settled = now - timedelta(seconds=settings.CHANGES_SETTLE_SECONDS)
+    kinds = visible_kinds(user, kinds or [kind for kind, _, _ in KINDS])
+    own_only = user.is_authenticated and user.role != 'Librarian'
+
+    sources = []
+    for rank, (kind, model, serializer) in enumerate(KINDS):
+        if kind not in kinds:
+            continue
+        queryset = after(model.objects.filter(updated_at__lt=settled), 'updated_at', rank, cursor)
+        if own_only and kind in PRIVATE_KINDS:
+            queryset = queryset.filter(user=user)
+        rows = list(queryset.order_by('updated_at', 'pk')[:limit + 1])
+        sources.append([((row.updated_at, rank, row.pk), kind, row, serializer) for row in rows])
+
+    tombstones = Tombstone.objects.filter(deleted_at__lt=settled, kind__in=kinds)
+    if own_only:
+        tombstones = tombstones.filter(~Q(kind__in=PRIVATE_KINDS) | Q(user_id=user.pk))
+    tombstones = after(tombstones, 'deleted_at', TOMBSTONE_RANK, cursor)
+    sources.append([
+        ((tombstone.deleted_at, TOMBSTONE_RANK, tombstone.pk), tombstone.kind, tombstone, None)
+        for tombstone in tombstones.order_by('deleted_at', 'pk')[:limit + 1]
+    ])
+
+    merged = list(heapq.merge(*sources, key=lambda change: change[0]))
+    page = merged[:limit]
+    has_more = len(merged) > limit
+    data = []
+    for key, kind, row, serializer in page:
+        if serializer is None:
+            data.append({'kind': kind, 'id': row.object_id, 'deleted': True, 'data': None})
+        else:
+            data.append({'kind': kind, 'id': row.pk, 'deleted': False, 'data': serializer(row).data})
+    if has_more:
+        next_token = encode_token(page[-1][0], synced)
+    else:
+        # Caught up: everything before the horizon has been served. Rank -1
+        # sorts before every source, so rows stamped at the horizon come next.
+        next_token = encode_token((settled, -1, 0), settled)
+    return {
+        'changes': data,
+        'next': next_token,
+        'has_more': has_more,
+    }
@@ -0,0 +1,51 @@
+"""
+Response compression.
+
+CompressionMiddleware compresses responses of at least
+RESPONSE_COMPRESSION_MIN_BYTES. It uses brotli for clients that accept
+``br`` when the optional brotli package is installed, and gzip otherwise
+(Django's GZipMiddleware, which also handles streamed responses such as the
+catalog export). Smaller responses aren't worth the CPU.
+"""
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Fast enough for per-request use; 11 (the default) is meant for static files
+BROTLI_QUALITY = 5
+
+
+def accepts(request, coding):
+    # coding is listed in Accept-Encoding, and not with q=0
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = part.strip().partition(';')
+        if name.strip().lower() == coding:
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+class CompressionMiddleware(GZipMiddleware):
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < settings.RESPONSE_COMPRESSION_MIN_BYTES:
+            return response
+        if (brotli is None or response.streaming or response.has_header('Content-Encoding')
+                or not accepts(request, 'br')):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(response.content, quality=BROTLI_QUALITY)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        # Same ETag rule as GZipMiddleware
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
@@ -0,0 +1,8 @@
+"""MySQL backend whose connections come from library.db.pool."""
+from django.db.backends.mysql import base
+
+from library.db.pool import PooledConnectionMixin
+
+
+class DatabaseWrapper(PooledConnectionMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,8 @@
+"""SQLite backend whose connections come from library.db.pool, for local runs and benchmarks."""
+from django.db.backends.sqlite3 import base
+
+from library.db.pool import PooledConnectionMixin
+
+
+class DatabaseWrapper(PooledConnectionMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,143 @@
+"""
+In-process database connection pool.
+
+Django keeps one connection per thread. Under an ASGI server every request
+runs its sync code on a new thread, so CONN_MAX_AGE can't reuse anything
+there: each request connects, and the persistent connections of finished
+threads linger until they are garbage collected. The backends in
+library.db.backends instead take connections from a pool shared by all
+threads of the process, and "closing" one hands it back.
+
+Each database gets at most POOL['SIZE'] connections. A thread that finds
+them all in use waits up to POOL['TIMEOUT'] seconds and then gets an
+OperationalError. Connections are rolled back on release, checked with
+``SELECT 1`` before reuse when CONN_HEALTH_CHECKS is on, and replaced once
+they are POOL['RECYCLE'] seconds old. A connection closed after a database
+error or inside a transaction is thrown away.
+"""
+import functools
+import threading
+import time
+
+from django.db.utils import OperationalError
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    def __init__(self, size, timeout, recycle, health_checks):
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.health_checks = health_checks
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.idle = []  # (connection, opened_at), most recently used last
+        self.opened_at = {}  # id(connection) -> opened_at, for checked-out connections
+
+    def acquire(self, connect):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise OperationalError(
+                f'No database connection free after {self.timeout}s (pool size {self.size}).')
+        try:
+            while True:
+                with self.lock:
+                    if not self.idle:
+                        break
+                    connection, opened_at = self.idle.pop()
+                if time.monotonic() - opened_at < self.recycle and self.usable(connection):
+                    return self.checkout(connection, opened_at)
+                self.discard(connection)
+            return self.checkout(connect(), time.monotonic())
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def checkout(self, connection, opened_at):
+        with self.lock:
+            self.opened_at[id(connection)] = opened_at
+        return connection
+
+    def release(self, connection, reusable=True):
+        with self.lock:
+            opened_at = self.opened_at.pop(id(connection), None)
+        if opened_at is None:  # not ours (e.g. opened before the pool existed)
+            return connection.close()
+        try:
+            if reusable and time.monotonic() - opened_at < self.recycle:
+                connection.rollback()
+                with self.lock:
+                    self.idle.append((connection, opened_at))
+            else:
+                self.discard(connection)
+        except Exception:
+            self.discard(connection)
+        finally:
+            self.slots.release()
+
+    def usable(self, connection):
+        if not self.health_checks:
+            return True
+        try:
+            cursor = connection.cursor()
+            cursor.execute('SELECT 1')
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def clear(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection, _ in idle:
+            self.discard(connection)
+
+    def stats(self):
+        with self.lock:
+            return {'size': self.size, 'idle': len(self.idle), 'in_use': len(self.opened_at)}
+
+
+def get_pool(settings_dict):
+    # One pool per database (not per alias), so a test database gets its own
+    key = tuple(settings_dict.get(name) for name in ('ENGINE', 'NAME', 'HOST', 'PORT', 'USER'))
+    with _pools_lock:
+        if key not in _pools:
+            options = settings_dict.get('POOL') or {}
+            _pools[key] = ConnectionPool(
+                size=options.get('SIZE', 10),
+                timeout=options.get('TIMEOUT', 10),
+                recycle=options.get('RECYCLE', 3600),
+                health_checks=settings_dict.get('CONN_HEALTH_CHECKS', False),
+            )
+        return _pools[key]
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.clear()
+
+
+class PooledConnectionMixin:
+    """Database wrapper mixin that takes connections from a ConnectionPool."""
+
+    @property
+    def pool(self):
+        return get_pool(self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        return self.pool.acquire(functools.partial(super().get_new_connection, conn_params))
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                return self.pool.release(
+                    self.connection, reusable=not (self.errors_occurred or self.in_atomic_block))
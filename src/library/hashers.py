@@ -0,0 +1,29 @@
+"""
+Password hashers with their cost parameters taken from settings.
+
+settings.PASSWORD_HASHERS puts the PASSWORD_HASHER choice first and keeps
+the others listed, so stored hashes of any of them still verify. Django
+re-hashes a password with the first hasher (or with its current parameters)
+at the user's next successful login.
+"""
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    work_factor = settings.PASSWORD_SCRYPT_WORK_FACTOR
+    block_size = settings.PASSWORD_SCRYPT_BLOCK_SIZE
+    parallelism = settings.PASSWORD_SCRYPT_PARALLELISM
+    # OpenSSL refuses anything above 32 MiB unless told otherwise
+    maxmem = 2 * 128 * work_factor * block_size
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    # Needs the argon2-cffi package
+    time_cost = settings.PASSWORD_ARGON2_TIME_COST
+    memory_cost = settings.PASSWORD_ARGON2_MEMORY_COST
+    parallelism = settings.PASSWORD_ARGON2_PARALLELISM
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    iterations = settings.PASSWORD_PBKDF2_ITERATIONS
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from library import archive
+
+
+class Command(BaseCommand):
+    help = "Move loans returned more than --months months ago into the borrow archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=settings.BORROW_ARCHIVE_MONTHS)
+        parser.add_argument('--batch-size', type=int, default=settings.BORROW_ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=0,
+                            help='seconds to wait between batches, to leave room for other writers')
+
+    def handle(self, months=None, batch_size=None, pause=None, **options):
+        cutoff = archive.months_before(timezone.localdate(), months)
+        moved = 0
+        for count in archive.archive_returned(cutoff, batch_size=batch_size, pause=pause):
+            moved += count
+            self.stdout.write(f'{moved} moved')
+        self.stdout.write(self.style.SUCCESS(f'{moved} loans returned before {cutoff} archived'))
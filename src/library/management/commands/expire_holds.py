@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from library import services
+
+
+class Command(BaseCommand):
+    help = "Expire reservation holds past their pickup window and pass the copies down the queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, batch_size=None, **options):
+        expired = services.expire_holds(batch_size=batch_size)
+        held = services.fill_waiting_holds()
+        self.stdout.write(self.style.SUCCESS(f'{expired} holds expired, {held} copies newly held'))
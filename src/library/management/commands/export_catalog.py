@@ -0,0 +1,22 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from library.bulk import EXPORT_MODELS, FORMATS, export_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream a table (books, borrows or reviews) out as CSV or JSONL.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=sorted(EXPORT_MODELS))
+        parser.add_argument('--format', dest='file_format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', '-o', default='-', help="file to write ('-' for stdout)")
+
+    def handle(self, table, file_format, output, **options):
+        rows = export_rows(EXPORT_MODELS[table], file_format)
+        if output == '-':
+            sys.stdout.writelines(rows)
+            return
+        with open(output, 'w', encoding='utf-8', newline='') as stream:
+            stream.writelines(rows)
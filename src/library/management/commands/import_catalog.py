@@ -0,0 +1,35 @@
+import json
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from library.bulk import FORMATS, import_books, read_rows, text_stream
+
+
+class Command(BaseCommand):
+    help = "Stream-import book copies from a CSV or JSONL file ('-' for stdin)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='file_format', choices=FORMATS,
+                            help='defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=settings.IMPORT_BATCH_SIZE)
+
+    def handle(self, path, file_format=None, batch_size=None, **options):
+        file_format = file_format or path.rsplit('.', 1)[-1].lower()
+        if file_format not in FORMATS:
+            raise CommandError(f"Cannot tell the format of '{path}'; pass --format")
+
+        if path == '-':
+            report = import_books(read_rows(text_stream(sys.stdin.buffer), file_format), batch_size)
+        else:
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                report = import_books(read_rows(stream, file_format), batch_size)
+
+        for error in report.errors:
+            self.stderr.write(f"row {error['row']}: {json.dumps(error['errors'])}")
+        summary = f'{report.created} created, {report.updated} updated, {report.failed} failed'
+        if report.error:
+            raise CommandError(f'{report.error} ({summary})')
+        self.stdout.write(self.style.SUCCESS(summary))
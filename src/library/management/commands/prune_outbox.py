@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from library import outbox
+
+
+class Command(BaseCommand):
+    help = "Delete notifications delivered more than --days days ago (default OUTBOX_RETENTION_DAYS)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.OUTBOX_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=1000, help='events deleted per query')
+
+    def handle(self, days=None, batch_size=None, **options):
+        # The sweep's de-duplication keys only have to outlive the day they were emitted
+        if days < 1:
+            raise CommandError('--days must be at least 1.')
+        horizon = timezone.now() - timedelta(days=days)
+        deleted = sum(outbox.prune(horizon, batch_size=batch_size))
+        self.stdout.write(self.style.SUCCESS(f'{deleted} delivered events deleted'))
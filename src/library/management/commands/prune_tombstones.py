@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from library.models import Tombstone
+
+
+class Command(BaseCommand):
+    help = "Delete changes-feed tombstones older than CHANGES_RETENTION_DAYS."
+
+    def handle(self, **options):
+        horizon = timezone.now() - timedelta(days=settings.CHANGES_RETENTION_DAYS)
+        deleted, _ = Tombstone.objects.filter(deleted_at__lt=horizon).delete()
+        self.stdout.write(self.style.SUCCESS(f'{deleted} tombstones deleted'))
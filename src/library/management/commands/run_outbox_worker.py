@@ -0,0 +1,27 @@
+import logging
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from library import outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver queued notifications (loan, return, due-soon, overdue, reservation) to the configured sinks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--workers', type=int, default=4, help='delivery threads')
+        parser.add_argument('--interval', type=float, default=1.0, help='seconds between polls when idle')
+        parser.add_argument('--sink', action='append', dest='sinks',
+                            help='dotted path of a sink class; repeatable, defaults to OUTBOX_SINKS')
+        parser.add_argument('--once', action='store_true', help='exit once nothing is due')
+
+    def handle(self, batch_size=None, workers=None, interval=None, sinks=None, once=False, **options):
+        logging.basicConfig(level=logging.INFO if options['verbosity'] > 1 else logging.WARNING)
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+
+        outbox.run(outbox.load_sinks(sinks), batch_size, workers, interval, once, stop)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from library.models import OpenLoan
+
+
+class Command(BaseCommand):
+    help = "Daily sweep of the open-loan ledger: repair drift and flag loans that became overdue."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, batch_size=None, **options):
+        counts = OpenLoan.objects.sweep(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            '{closed} closed, {added} added, {rescheduled} rescheduled, {flagged} newly overdue'.format(**counts)
+        ))
@@ -0,0 +1,211 @@
+"""
+Per-route request metrics.
+
+RequestMetricsMiddleware samples a fraction of requests (METRICS_SAMPLE_RATE)
+and, for each sampled one, wraps every database connection with an
+execute_wrapper to time queries and spot repeats. The totals are folded
+into an in-process registry keyed by the resolved route name (e.g.
+``borrow-mark-returned``), served in Prometheus text format by
+``/api/metrics/``. Each server process keeps its own registry, so scrape
+every worker (or run a single one) for whole-site numbers.
+"""
+import hmac
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from rest_framework.permissions import BasePermission
+from rest_framework.renderers import BaseRenderer
+
+# Upper bounds (seconds) of the request duration histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+UNRESOLVED = '<unresolved>'
+
+
+class QueryRecorder:
+    # execute_wrapper that adds up query time and counts repeated SQL
+    def __init__(self):
+        self.count = 0
+        self.duplicates = 0
+        self.seconds = 0.0
+        self._seen = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+            # Same statement with any parameters: the N+1 signature
+            if sql in self._seen:
+                self.duplicates += 1
+            else:
+                self._seen.add(sql)
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)                           # (route, method, status) -> n
+            self.histograms = defaultdict(lambda: [0] * len(BUCKETS))  # (route, method) -> bucket counts
+            self.totals = defaultdict(lambda: defaultdict(float))      # (route, method) -> name -> sum
+
+    def record(self, route, method, status, seconds, recorder, response_bytes):
+        key = (route, method)
+        with self._lock:
+            self.requests[(route, method, f'{status // 100}xx')] += 1
+            buckets = self.histograms[key]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            totals = self.totals[key]
+            totals['count'] += 1
+            totals['seconds'] += seconds
+            totals['db_seconds'] += recorder.seconds
+            totals['queries'] += recorder.count
+            totals['duplicate_queries'] += recorder.duplicates
+            totals['response_bytes'] += response_bytes
+
+    def render(self):
+        # Prometheus text exposition format
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def labels(route, method, **extra):
+            pairs = {'route': route, 'method': method, **extra}
+            return ','.join(f'{k}="{_escape(v)}"' for k, v in pairs.items())
+
+        with self._lock:
+            family('library_metrics_sample_rate', 'gauge', 'Fraction of requests recorded below')
+            lines.append(f'library_metrics_sample_rate {settings.METRICS_SAMPLE_RATE}')
+
+            family('library_http_requests_total', 'counter', 'Sampled requests by route, method and status class')
+            for (route, method, status), n in sorted(self.requests.items()):
+                lines.append(f'library_http_requests_total{{{labels(route, method, status=status)}}} {n}')
+
+            family('library_http_request_duration_seconds', 'histogram', 'Wall time of sampled requests')
+            for (route, method), buckets in sorted(self.histograms.items()):
+                totals = self.totals[(route, method)]
+                for bound, n in zip(BUCKETS, buckets):
+                    lines.append(
+                        f'library_http_request_duration_seconds_bucket{{{labels(route, method, le=bound)}}} {n}'
+                    )
+                lines.append(
+                    f'library_http_request_duration_seconds_bucket{{{labels(route, method, le="+Inf")}}} '
+                    f'{int(totals["count"])}'
+                )
+                lines.append(f'library_http_request_duration_seconds_sum{{{labels(route, method)}}} '
+                             f'{totals["seconds"]:.6f}')
+                lines.append(f'library_http_request_duration_seconds_count{{{labels(route, method)}}} '
+                             f'{int(totals["count"])}')
+
+            for name, field, help_text in (
+                ('library_db_query_seconds_total', 'db_seconds', 'Time spent in database queries'),
+                ('library_db_queries_total', 'queries', 'Database queries run'),
+                ('library_db_duplicate_queries_total', 'duplicate_queries',
+                 'Queries repeating SQL already run in the same request'),
+                ('library_http_response_bytes_total', 'response_bytes', 'Response body bytes'),
+            ):
+                family(name, 'counter', help_text)
+                for (route, method), totals in sorted(self.totals.items()):
+                    value = totals[field]
+                    value = f'{value:.6f}' if field == 'db_seconds' else int(value)
+                    lines.append(f'{name}{{{labels(route, method)}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+
+def wrap_connections(stack, recorder):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(recorder))
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            wrap_connections(stack, recorder)
+            response = self.get_response(request)
+        return self.finish(request, response, time.perf_counter() - start, recorder)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            return await self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        # The async ORM runs queries on the request's thread-sensitive
+        # executor thread (one per request under an ASGI server), whose
+        # connections are the ones to wrap
+        stack = ExitStack()
+        await sync_to_async(wrap_connections)(stack, recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.finish(request, response, time.perf_counter() - start, recorder)
+
+    def finish(self, request, response, seconds, recorder):
+        match = request.resolver_match
+        route = (match.view_name if match else None) or UNRESOLVED
+        size = 0 if response.streaming else len(response.content)
+        registry.record(route, request.method, response.status_code, seconds, recorder, size)
+
+        response['Server-Timing'] = (
+            f'app;dur={seconds * 1000:.1f}, '
+            f'db;dur={recorder.seconds * 1000:.1f};desc="{recorder.count} queries, {recorder.duplicates} repeated"'
+        )
+        return response
+
+
+class HasMetricsToken(BasePermission):
+    # Scrapers send "Authorization: Token <METRICS_TOKEN>" (JWT auth only claims "Bearer")
+    def has_permission(self, request, view):
+        token = settings.METRICS_TOKEN
+        sent = request.headers.get('Authorization', '')
+        # Constant-time, so the token can't be guessed byte by byte from response times
+        return bool(token) and hmac.compare_digest(sent.encode(), f'Token {token}'.encode())
+
+
+class PrometheusRenderer(BaseRenderer):
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Error responses (e.g. 403) arrive as dicts
+        return data if isinstance(data, str) else f'{data}\n'
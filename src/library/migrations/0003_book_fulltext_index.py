@@ -0,0 +1,29 @@
+from django.db import migrations
+
+INDEX_NAME = 'library_book_search_ft'
+
+
+def create_fulltext_index(apps, schema_editor):
+    # FULLTEXT is MySQL-only; other databases fall back to the in-process index
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(
+        f'CREATE FULLTEXT INDEX {INDEX_NAME} ON library_book (title, author, isbn, category)'
+    )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(f'DROP INDEX {INDEX_NAME} ON library_book')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0002_alter_librarycard_user_alter_reserve_reserve_date_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0003_book_fulltext_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['isbn', 'status'], name='library_boo_isbn_2e25ad_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['status', 'category'], name='library_boo_status_fc1749_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(fields=['return_date', 'due_date'], name='library_bor_return__c22f43_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(fields=['user', 'return_date'], name='library_bor_user_id_ddcd53_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserve',
+            index=models.Index(fields=['isbn', 'status'], name='library_res_isbn_d50529_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['isbn'], name='library_rev_isbn_7ab195_idx'),
+        ),
+    ]
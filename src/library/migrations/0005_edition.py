@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0004_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Edition',
+            fields=[
+                ('edition_id', models.AutoField(primary_key=True, serialize=False)),
+                ('isbn', models.CharField(max_length=50, unique=True)),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('author', models.CharField(blank=True, max_length=100)),
+                ('total_copies', models.PositiveIntegerField(default=0)),
+                ('available_copies', models.PositiveIntegerField(default=0)),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='edition',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='%(class)ss', to='library.edition'),
+        ),
+        migrations.AddField(
+            model_name='reserve',
+            name='edition',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='%(class)ss', to='library.edition'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='edition',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='%(class)ss', to='library.edition'),
+        ),
+    ]
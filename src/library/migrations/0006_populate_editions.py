@@ -0,0 +1,63 @@
+from django.db import migrations
+from django.db.models import Count, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_editions(apps, schema_editor):
+    Edition = apps.get_model('library', 'Edition')
+    Book = apps.get_model('library', 'Book')
+    Reserve = apps.get_model('library', 'Reserve')
+    Review = apps.get_model('library', 'Review')
+    linked = (Book, Reserve, Review)
+
+    # One Edition per distinct isbn, titled after its first copy if there is one
+    titles = {
+        row['isbn']: row for row in
+        Book.objects.values('isbn').annotate(title=Min('title'), author=Min('author')).order_by()
+    }
+    isbns = set()
+    for model in linked:
+        isbns.update(model.objects.values_list('isbn', flat=True).distinct())
+    Edition.objects.bulk_create([
+        Edition(
+            isbn=isbn,
+            title=titles.get(isbn, {}).get('title', ''),
+            author=titles.get(isbn, {}).get('author', ''),
+        )
+        for isbn in isbns
+    ], batch_size=1000)
+
+    # Point every row at its Edition with one UPDATE per table
+    edition_of_row = Subquery(Edition.objects.filter(isbn=OuterRef('isbn')).values('pk')[:1])
+    for model in linked:
+        model.objects.update(edition=edition_of_row)
+
+    def per_edition(queryset, value):
+        return Coalesce(Subquery(
+            queryset.filter(edition=OuterRef('pk')).order_by().values('edition')
+            .annotate(n=value).values('n')
+        ), Value(0))
+
+    Edition.objects.update(
+        total_copies=per_edition(Book.objects.all(), Count('pk')),
+        available_copies=per_edition(Book.objects.filter(status='Available'), Count('pk')),
+        review_count=per_edition(Review.objects.all(), Count('pk')),
+        rating_sum=per_edition(Review.objects.all(), Sum('rating')),
+    )
+
+
+def unlink_editions(apps, schema_editor):
+    for name in ('Book', 'Reserve', 'Review'):
+        apps.get_model('library', name).objects.update(edition=None)
+    apps.get_model('library', 'Edition').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0005_edition'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_editions, unlink_editions),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_open_loans(apps, schema_editor):
+    # Copy every unreturned loan into the ledger, in bounded batches
+    Borrow = apps.get_model('library', 'Borrow')
+    OpenLoan = apps.get_model('library', 'OpenLoan')
+    loans = Borrow.objects.filter(return_date__isnull=True).values_list('pk', 'user_id', 'due_date')
+    batch = []
+    for pk, user_id, due_date in loans.iterator(chunk_size=2000):
+        batch.append(OpenLoan(borrow_id=pk, user_id=user_id, due_date=due_date))
+        if len(batch) >= 2000:
+            OpenLoan.objects.bulk_create(batch)
+            batch = []
+    OpenLoan.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0006_populate_editions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OpenLoan',
+            fields=[
+                ('borrow', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='open_loan', serialize=False, to='library.borrow')),
+                ('due_date', models.DateField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['due_date'], name='library_ope_due_dat_28f5bc_idx'), models.Index(fields=['user', 'due_date'], name='library_ope_user_id_a76f06_idx')],
+            },
+        ),
+        migrations.RunPython(populate_open_loans, migrations.RunPython.noop),
+    ]
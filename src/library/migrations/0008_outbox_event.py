@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:49
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0007_open_loan_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('event_id', models.AutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('loan.created', 'Loan created'), ('loan.returned', 'Loan returned'), ('loan.due_soon', 'Loan due soon'), ('loan.overdue', 'Loan overdue'), ('reservation.fulfilled', 'Reservation fulfilled')], max_length=30)),
+                ('key', models.CharField(blank=True, max_length=100, null=True, unique=True)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Delivered', 'Delivered'), ('Failed', 'Failed')], default='Pending', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'available_at'], name='library_out_status_056a21_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0008_outbox_event'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='reserve',
+            name='library_res_isbn_d50529_idx',
+        ),
+        migrations.AddField(
+            model_name='reserve',
+            name='held_book',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='holds', to='library.book'),
+        ),
+        migrations.AddField(
+            model_name='reserve',
+            name='hold_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='outboxevent',
+            name='kind',
+            field=models.CharField(choices=[('loan.created', 'Loan created'), ('loan.returned', 'Loan returned'), ('loan.due_soon', 'Loan due soon'), ('loan.overdue', 'Loan overdue'), ('reservation.ready', 'Reservation ready for pickup'), ('reservation.expired', 'Reservation expired'), ('reservation.fulfilled', 'Reservation fulfilled')], max_length=30),
+        ),
+        migrations.AlterField(
+            model_name='reserve',
+            name='status',
+            field=models.CharField(choices=[('Pending', 'Pending'), ('Ready', 'Ready'), ('Fulfilled', 'Fulfilled'), ('Canceled', 'Canceled'), ('Expired', 'Expired')], max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='reserve',
+            index=models.Index(fields=['isbn', 'status', 'reserve_id'], name='library_res_isbn_9d6dae_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserve',
+            index=models.Index(fields=['status', 'hold_expires_at'], name='library_res_status_3ead52_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:22
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_ratings(apps, schema_editor):
+    Edition = apps.get_model('library', 'Edition')
+    Review = apps.get_model('library', 'Review')
+
+    def reviews_with(stars):
+        return Coalesce(Subquery(
+            Review.objects.filter(edition=OuterRef('pk'), rating=stars).order_by().values('edition')
+            .annotate(n=Count('pk')).values('n')
+        ), Value(0))
+
+    Edition.objects.update(**{f'rating_{stars}': reviews_with(stars) for stars in range(1, 6)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0010_token_auth'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='edition',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='edition',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='edition',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='edition',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='edition',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='rating',
+            field=models.IntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)]),
+        ),
+        migrations.RunPython(count_ratings, migrations.RunPython.noop),
+    ]
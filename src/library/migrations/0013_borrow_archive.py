@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:29
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0012_change_tracking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBorrow',
+            fields=[
+                ('borrow_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('borrow_date', models.DateField()),
+                ('return_date', models.DateField()),
+                ('due_date', models.DateField()),
+                ('delay_status', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='library.book')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'borrow_date'], name='library_arc_user_id_5261aa_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:42
+
+from django.db import migrations, models
+
+
+def move_overdue_flags(apps, schema_editor):
+    # The sweep used to flag open loans through Borrow.delay_status, which
+    # otherwise means "returned late"; the flag now lives on the ledger
+    Borrow = apps.get_model('library', 'Borrow')
+    OpenLoan = apps.get_model('library', 'OpenLoan')
+    OpenLoan.objects.filter(borrow__delay_status=True).update(overdue_flagged=True)
+    Borrow.objects.filter(return_date__isnull=True, delay_status=True).update(delay_status=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0013_borrow_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='openloan',
+            name='overdue_flagged',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(move_overdue_flags, migrations.RunPython.noop),
+    ]
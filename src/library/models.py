@@ -1,7 +1,15 @@
+from datetime import timedelta
+
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
-from django.db import models
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models, transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
+# Star ratings a review can give
+RATINGS = range(1, 6)
+
 class UserManager(BaseUserManager):
     def create_user(self, email, password=None, role='Reader', **extra_fields):
         if not email:
@@ -39,6 +47,32 @@ class User(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.email
 
+# User rebuilt by library.authentication from verified JWT claims without a
+# query. Columns the token does not carry are deferred; the first access to
+# any of them fills them all from the authentication user cache.
+class TokenUser(User):
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if not fields or from_queryset is not None or not deferred.issuperset(fields):
+            return super().refresh_from_db(using, fields, from_queryset)
+        from .authentication import user_cache
+        user = user_cache.get(self.pk)
+        if user is None:
+            raise User.DoesNotExist('User matching the token no longer exists.')
+        for attname in deferred:
+            setattr(self, attname, getattr(user, attname))
+
+class TokenRevocation(models.Model):
+    # A revoked token (jti set) or, with jti empty, every token of the user
+    # issued before created_at. Rows are pointless once expires_at passes.
+    jti = models.CharField(max_length=255, blank=True, db_index=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+
 class Reader(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
     address = models.CharField(max_length=255, null=True, blank=True)
@@ -57,7 +91,245 @@ class LibraryCard(models.Model):
         return f"Card {self.card_id} - {self.user.email}"
 
 
-class Book(models.Model):
+def per_edition(queryset, value):
+    # Correlated subquery: value aggregated over queryset's rows of each Edition, 0 if none
+    return Coalesce(Subquery(
+        queryset.filter(edition=OuterRef('pk')).order_by().values('edition')
+        .annotate(n=value).values('n')
+    ), Value(0))
+
+
+class EditionManager(models.Manager):
+    def for_isbn(self, isbn, title='', author=''):
+        edition, created = self.get_or_create(isbn=isbn, defaults={'title': title, 'author': author})
+        if not created and title and not edition.title:
+            # First physical copy of a title that so far only had reviews/reservations
+            self.filter(pk=edition.pk).update(title=title, author=author)
+            edition.title, edition.author = title, author
+        return edition
+
+    def adjust(self, edition_id, **deltas):
+        # Counter update done in SQL, e.g. adjust(pk, available_copies=-1)
+        deltas = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        if edition_id is not None and deltas:
+            self.filter(pk=edition_id).update(**deltas)
+
+    def adjust_many(self, field, deltas):
+        # One UPDATE for many editions: deltas is {edition_id: delta}
+        deltas = {pk: delta for pk, delta in deltas.items() if pk is not None and delta}
+        if deltas:
+            change = Case(*[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()], default=Value(0))
+            self.filter(pk__in=deltas).update(**{field: F(field) + change})
+
+    def count_copy(self, edition_id, status, sign=1):
+        # Add (sign=1) or remove (sign=-1) one physical copy in the given status
+        self.adjust(edition_id, total_copies=sign, available_copies=sign if status == 'Available' else 0)
+
+    def copy_status_changed(self, edition_id, old_status, new_status):
+        delta = (new_status == 'Available') - (old_status == 'Available')
+        self.adjust(edition_id, available_copies=delta)
+
+    def count_review(self, edition_id, rating, sign=1):
+        stars = {f'rating_{rating}': sign} if rating in RATINGS else {}
+        self.adjust(edition_id, review_count=sign, rating_sum=sign * rating, **stars)
+
+    def availability(self, isbns):
+        # Copies per status and pending holds of each title, in one statement
+        def copies(status):
+            return per_edition(Book.objects.filter(status=status), Count('pk'))
+
+        return self.filter(isbn__in=isbns).annotate(
+            borrowed=copies('Borrowed'),
+            reserved=copies('Reserved'),
+            pending_reservations=per_edition(Reserve.objects.filter(status='Pending'), Count('pk')),
+        ).values('isbn', 'total_copies', 'available_copies', 'borrowed', 'reserved', 'pending_reservations')
+
+    def sync(self, isbns=None):
+        # Set-based repair after bulk writes: create missing editions, link
+        # unlinked copies/reservations/reviews by isbn, recompute counters.
+        linked = (Book, Reserve, Review)
+        scope = {'isbn__in': isbns} if isbns is not None else {}
+
+        known = set(self.filter(**scope).values_list('isbn', flat=True))
+        titles = {
+            row['isbn']: row for row in
+            Book.objects.filter(**scope).values('isbn').annotate(
+                first_title=models.Min('title'), first_author=models.Min('author')
+            ).order_by()
+        }
+        missing = set()
+        for model in linked:
+            missing.update(model.objects.filter(**scope).values_list('isbn', flat=True).distinct())
+        missing -= known
+        self.bulk_create([
+            Edition(
+                isbn=isbn,
+                title=titles.get(isbn, {}).get('first_title', ''),
+                author=titles.get(isbn, {}).get('first_author', ''),
+            )
+            for isbn in missing
+        ], batch_size=1000)
+
+        edition_of_row = Subquery(self.filter(isbn=OuterRef('isbn')).values('pk')[:1])
+        for model in linked:
+            model.objects.filter(edition__isnull=True, **scope).update(edition=edition_of_row)
+
+        self.filter(**scope).update(
+            total_copies=per_edition(Book.objects.all(), Count('pk')),
+            available_copies=per_edition(Book.objects.filter(status='Available'), Count('pk')),
+            review_count=per_edition(Review.objects.all(), Count('pk')),
+            rating_sum=per_edition(Review.objects.all(), Sum('rating')),
+            **{
+                f'rating_{stars}': per_edition(Review.objects.filter(rating=stars), Count('pk'))
+                for stars in RATINGS
+            },
+        )
+
+
+# Title-level record shared by every physical copy with the same ISBN
+class Edition(models.Model):
+    edition_id = models.AutoField(primary_key=True)
+    isbn = models.CharField(max_length=50, unique=True)
+    title = models.CharField(max_length=255, blank=True)
+    author = models.CharField(max_length=100, blank=True)
+    # Maintained counters, so availability and ratings are single-row reads
+    total_copies = models.PositiveIntegerField(default=0)
+    available_copies = models.PositiveIntegerField(default=0)
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    # Reviews per star rating
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+
+    objects = EditionManager()
+
+    @property
+    def average_rating(self):
+        if not self.review_count:
+            return None
+        return round(self.rating_sum / self.review_count, 2)
+
+    @property
+    def rating_histogram(self):
+        return {stars: getattr(self, f'rating_{stars}') for stars in RATINGS}
+
+    def __str__(self):
+        return f"{self.isbn} - {self.title}"
+
+
+class TrackedQuerySet(models.QuerySet):
+    # Bulk writes move updated_at too, so the changes feed sees them
+    def update(self, **kwargs):
+        kwargs.setdefault('updated_at', timezone.now())
+        return super().update(**kwargs)
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        now = timezone.now()
+        for obj in objs:
+            obj.updated_at = now
+        return super().bulk_update(objs, list(dict.fromkeys([*fields, 'updated_at'])), batch_size=batch_size)
+
+
+class ChangeTracked(models.Model):
+    """
+    Rows served by the changes feed (library.changes). updated_at moves on
+    every save, QuerySet.update() and bulk_update(); deleting a row leaves a
+    Tombstone (see signals).
+    """
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = TrackedQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'updated_at'}
+        super().save(*args, **kwargs)
+
+
+class EditionLinked(models.Model):
+    """
+    Rows that refer to a title by isbn also carry a foreign key to its
+    Edition. save() and delete() keep the Edition counters in step with the
+    row; QuerySet.update()/bulk_create() bypass them, so code using those
+    adjusts the counters itself (or calls Edition.objects.sync()).
+    """
+    edition = models.ForeignKey(
+        Edition, on_delete=models.PROTECT, null=True, editable=False, related_name='%(class)ss'
+    )
+
+    # Fields whose change moves this row between counters
+    counted_fields = ('isbn',)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if all(field in instance.__dict__ for field in ('edition_id', *cls.counted_fields)):
+            instance._stored = instance._snapshot()
+        return instance
+
+    def _snapshot(self):
+        return {field: getattr(self, field) for field in ('edition_id', *self.counted_fields)}
+
+    def _stored_snapshot(self):
+        # Counted values as they are in the database, or None for a new row
+        stored = self.__dict__.get('_stored')
+        if stored is None and not self._state.adding:
+            stored = type(self)._base_manager.filter(pk=self.pk).values(
+                'edition_id', *self.counted_fields
+            ).first()
+        return stored
+
+    def stored(self, **values):
+        # Record values already written with QuerySet.update() so save() won't count them again
+        for field, value in values.items():
+            setattr(self, field, value)
+        if self.__dict__.get('_stored') is not None:
+            self._stored.update({k: v for k, v in values.items() if k in self._stored})
+
+    def edition_defaults(self):
+        return {}
+
+    def count_in_edition(self, values, sign):
+        # Apply this row's contribution (values from _snapshot) to its Edition counters
+        pass
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            old = self._stored_snapshot()
+            if self.edition_id is None or (old is not None and self.isbn != old['isbn']):
+                self.edition = Edition.objects.for_isbn(self.isbn, **self.edition_defaults())
+                update_fields = kwargs.get('update_fields')
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'edition'}
+            super().save(*args, **kwargs)
+            new = self._snapshot()
+            if old != new:
+                if old is not None:
+                    self.count_in_edition(old, -1)
+                self.count_in_edition(new, 1)
+            self._stored = new
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            old = self._stored_snapshot()
+            result = super().delete(*args, **kwargs)
+            if old is not None:
+                self.count_in_edition(old, -1)
+        self._stored = None
+        return result
+
+
+class Book(ChangeTracked, EditionLinked):
     STATUS_CHOICES = [
         ('Available', 'Available'),
         ('Borrowed', 'Borrowed'),
@@ -72,7 +344,23 @@ class Book(models.Model):
     category = models.CharField(max_length=50)
     shelf_loc = models.CharField(max_length=50)
 
-class Borrow(models.Model):
+    counted_fields = ('isbn', 'status')
+
+    def edition_defaults(self):
+        return {'title': self.title, 'author': self.author}
+
+    def count_in_edition(self, values, sign):
+        Edition.objects.count_copy(values['edition_id'], values['status'], sign)
+
+    class Meta:
+        indexes = [
+            # fulfill: available copies of an ISBN
+            models.Index(fields=['isbn', 'status']),
+            # catalog filters and per-status counts
+            models.Index(fields=['status', 'category']),
+        ]
+
+class Borrow(ChangeTracked):
     borrow_id = models.AutoField(primary_key=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
@@ -84,14 +372,130 @@ class Borrow(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=['user']),
-            models.Index(fields=['book'])
+            models.Index(fields=['book']),
+            # open loans by due date (overdue / due soon): return_date IS NULL AND due_date ...
+            models.Index(fields=['return_date', 'due_date']),
+            models.Index(fields=['user', 'return_date']),
         ]
 
-class Reserve(models.Model):
+    def save(self, *args, **kwargs):
+        # The open-loan ledger follows every save; QuerySet.update()/bulk_create()
+        # callers maintain it themselves (or rely on the daily sweep)
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            OpenLoan.objects.track(self, adding)
+
+
+class ArchivedBorrow(models.Model):
+    """
+    A returned loan moved out of Borrow by manage.py archive_borrows, under
+    its original borrow_id. Only the full reader history (see library.archive)
+    and the stats totals read it.
+    """
+    borrow_id = models.IntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE)
+    borrow_date = models.DateField()
+    return_date = models.DateField()
+    due_date = models.DateField()
+    delay_status = models.BooleanField(default=False)
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'borrow_date']),
+        ]
+
+
+# Loans due within this many days count as "due soon"
+DUE_SOON_DAYS = 3
+
+
+class OpenLoanManager(models.Manager):
+    def track(self, borrow, adding=False):
+        # Mirror one loan: present while unreturned, gone once returned
+        if borrow.return_date is not None:
+            if not adding:
+                self.close([borrow.pk])
+        elif adding or not self.filter(pk=borrow.pk).update(user_id=borrow.user_id, due_date=borrow.due_date):
+            self.create(borrow_id=borrow.pk, user_id=borrow.user_id, due_date=borrow.due_date)
+
+    def close(self, borrow_ids):
+        self.filter(pk__in=borrow_ids).delete()
+
+    def overdue(self, today=None):
+        return self.filter(due_date__lt=today or timezone.now().date())
+
+    def due_between(self, start, end):
+        return self.filter(due_date__range=[start, end])
+
+    def sweep(self, today=None, batch_size=1000):
+        """
+        Daily repair and overdue marking. Drops returned loans, adds open
+        loans written around the ledger, refreshes changed due dates and
+        flags ledger rows that are now past due. Returns counts.
+        """
+        today = today or timezone.now().date()
+        closed, _ = self.filter(borrow__return_date__isnull=False).delete()
+
+        added = 0
+        missing = Borrow.objects.filter(return_date__isnull=True, open_loan__isnull=True)
+        while True:
+            batch = list(missing.order_by('pk').values_list('pk', 'user_id', 'due_date')[:batch_size])
+            if not batch:
+                break
+            self.bulk_create([OpenLoan(borrow_id=pk, user_id=user, due_date=due) for pk, user, due in batch])
+            added += len(batch)
+
+        rescheduled = self.exclude(due_date=F('borrow__due_date')).update(
+            due_date=Subquery(Borrow.objects.filter(pk=OuterRef('pk')).values('due_date')[:1])
+        )
+        with transaction.atomic():
+            newly_overdue = list(
+                self.overdue(today).filter(overdue_flagged=False).values_list('pk', 'user_id', 'due_date')
+            )
+            self.filter(pk__in=[pk for pk, _, _ in newly_overdue]).update(overdue_flagged=True)
+            due_soon = list(
+                self.filter(due_date=today + timedelta(days=DUE_SOON_DAYS)).values_list('pk', 'user_id', 'due_date')
+            )
+            # Keys make a second sweep on the same day a no-op for notifications
+            OutboxEvent.objects.emit_many(
+                [('loan.overdue', user, f'loan.overdue:{pk}:{due}', {'borrow_id': pk, 'due_date': due.isoformat()})
+                 for pk, user, due in newly_overdue]
+                + [('loan.due_soon', user, f'loan.due_soon:{pk}:{due}', {'borrow_id': pk, 'due_date': due.isoformat()})
+                   for pk, user, due in due_soon]
+            )
+        return {'closed': closed, 'added': added, 'rescheduled': rescheduled,
+                'flagged': len(newly_overdue), 'due_soon': len(due_soon)}
+
+
+# Ledger of unreturned loans. Overdue and due-soon lookups read this small
+# table instead of scanning the ever-growing borrow history.
+class OpenLoan(models.Model):
+    borrow = models.OneToOneField(Borrow, on_delete=models.CASCADE, primary_key=True, related_name='open_loan')
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    due_date = models.DateField()
+    # Set by the sweep once the loan is past due (and its notice emitted).
+    # Borrow.delay_status keeps meaning "returned late" and is set at return.
+    overdue_flagged = models.BooleanField(default=False)
+
+    objects = OpenLoanManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['due_date']),
+            models.Index(fields=['user', 'due_date']),
+        ]
+
+class Reserve(ChangeTracked, EditionLinked):
     STATUS_CHOICES = [
         ('Pending', 'Pending'),
+        ('Ready', 'Ready'),
         ('Fulfilled', 'Fulfilled'),
-        ('Canceled', 'Canceled')
+        ('Canceled', 'Canceled'),
+        ('Expired', 'Expired')
     ]
 
     reserve_id = models.AutoField(primary_key=True)
@@ -99,15 +503,105 @@ class Reserve(models.Model):
     isbn = models.CharField(max_length=50)
     reserve_date = models.DateField(auto_now_add=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    # While Ready: the copy set aside for this reader and the end of the pickup window
+    held_book = models.ForeignKey(Book, on_delete=models.SET_NULL, null=True, blank=True, related_name='holds')
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
 
-class Review(models.Model):
+    class Meta:
+        indexes = [
+            # hold queue: pending reservations of an ISBN in arrival order
+            models.Index(fields=['isbn', 'status', 'reserve_id']),
+            # expiry job: ready holds by deadline
+            models.Index(fields=['status', 'hold_expires_at']),
+        ]
+
+class Review(ChangeTracked, EditionLinked):
     review_id = models.AutoField(primary_key=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     isbn = models.CharField(max_length=50)
-    rating = models.IntegerField()
+    rating = models.IntegerField(validators=[MinValueValidator(RATINGS[0]), MaxValueValidator(RATINGS[-1])])
     comment = models.TextField()
     review_date = models.DateField(auto_now_add=True)
 
+    counted_fields = ('isbn', 'rating')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['isbn']),
+        ]
+
+    def count_in_edition(self, values, sign):
+        Edition.objects.count_review(values['edition_id'], values['rating'], sign)
+
     def clean(self):
-        if not 1 <= self.rating <= 5:
-            raise models.ValidationError('Rating must be between 1 and 5')
\ No newline at end of file
+        if self.rating not in RATINGS:
+            raise models.ValidationError('Rating must be between 1 and 5')
+
+# A deleted Book, Borrow, Reserve or Review, for the changes feed
+class Tombstone(models.Model):
+    KIND_CHOICES = [
+        ('book', 'Book'),
+        ('borrow', 'Borrow'),
+        ('reserve', 'Reserve'),
+        ('review', 'Review'),
+    ]
+
+    tombstone_id = models.AutoField(primary_key=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.IntegerField()
+    # Owner of a deleted loan or reservation, so readers only see their own
+    user_id = models.IntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+
+class OutboxManager(models.Manager):
+    def emit(self, kind, user_id, key=None, **payload):
+        # Record an event in the caller's transaction; the outbox worker delivers it
+        return self.create(kind=kind, user_id=user_id, key=key, payload=payload)
+
+    def emit_many(self, events):
+        # events: (kind, user_id, key, payload) tuples; already-recorded keys are skipped
+        self.bulk_create([
+            OutboxEvent(kind=kind, user_id=user_id, key=key, payload=payload)
+            for kind, user_id, key, payload in events
+        ], batch_size=1000, ignore_conflicts=True)
+
+
+# Notifications waiting to be delivered (transactional outbox)
+class OutboxEvent(models.Model):
+    KIND_CHOICES = [
+        ('loan.created', 'Loan created'),
+        ('loan.returned', 'Loan returned'),
+        ('loan.due_soon', 'Loan due soon'),
+        ('loan.overdue', 'Loan overdue'),
+        ('reservation.ready', 'Reservation ready for pickup'),
+        ('reservation.expired', 'Reservation expired'),
+        ('reservation.fulfilled', 'Reservation fulfilled'),
+    ]
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Delivered', 'Delivered'),
+        ('Failed', 'Failed')
+    ]
+
+    event_id = models.AutoField(primary_key=True)
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Optional de-duplication key for events produced by periodic jobs
+    key = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Earliest time of the next delivery attempt (retry backoff and worker lease)
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    objects = OutboxManager()
+
+    class Meta:
+        indexes = [
+            # worker: next due pending events
+            models.Index(fields=['status', 'available_at']),
+        ]
@@ -0,0 +1,173 @@
+"""
+Delivery side of the notification outbox.
+
+Circulation writes OutboxEvent rows in the same transaction as the change
+they describe. The worker (``manage.py run_outbox_worker``) claims due
+events in batches, hands them to the configured sinks on a thread pool and
+records the outcome. Failed deliveries are retried with exponential backoff
+and jitter until MAX_ATTEMPTS. A claim is a lease: if a worker dies
+mid-batch its events become due again, so delivery is at-least-once.
+Delivered events are deleted after OUTBOX_RETENTION_DAYS by
+``manage.py prune_outbox``.
+"""
+import json
+import logging
+import random
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+# Give up on an event after this many failed deliveries
+MAX_ATTEMPTS = 8
+
+# Retry delays grow as BACKOFF_BASE * 2 ** (attempt - 1), capped
+BACKOFF_BASE = timedelta(seconds=5)
+BACKOFF_CAP = timedelta(hours=1)
+
+# How long a claimed batch stays hidden from other workers
+LEASE = timedelta(minutes=5)
+
+
+def event_message(event):
+    return {
+        'event_id': event.event_id,
+        'kind': event.kind,
+        'user_id': event.user_id,
+        'created_at': event.created_at.isoformat(),
+        **event.payload,
+    }
+
+
+class ConsoleSink:
+    # Prints one JSON line per event; for local development
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def send(self, event):
+        line = json.dumps(event_message(event))
+        with self._lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+
+class FileSink:
+    # Appends one JSON line per event to OUTBOX_FILE_PATH
+    def __init__(self, path=None):
+        self.path = path or settings.OUTBOX_FILE_PATH
+        self._lock = threading.Lock()
+
+    def send(self, event):
+        line = json.dumps(event_message(event))
+        with self._lock, open(self.path, 'a', encoding='utf-8') as stream:
+            stream.write(line + '\n')
+
+
+def load_sinks(paths=None):
+    # Sinks are any class with send(event) that raises on failure
+    return [import_string(path)() for path in (paths or settings.OUTBOX_SINKS)]
+
+
+def backoff(attempts):
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_CAP)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def claim(batch_size):
+    """
+    Take up to ``batch_size`` due events and push their ``available_at``
+    past the lease, so concurrent workers pick different events.
+    """
+    now = timezone.now()
+    due = OutboxEvent.objects.filter(status='Pending', available_at__lte=now).order_by('available_at', 'event_id')
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            events = list(due.select_for_update(skip_locked=True)[:batch_size])
+            OutboxEvent.objects.filter(pk__in=[e.pk for e in events]).update(available_at=now + LEASE)
+        else:
+            # Keep only the events whose conditional update we won
+            events = [
+                e for e in due[:batch_size]
+                if OutboxEvent.objects.filter(pk=e.pk, available_at=e.available_at).update(available_at=now + LEASE)
+            ]
+    return events
+
+
+def _deliver(sinks, event):
+    try:
+        for sink in sinks:
+            sink.send(event)
+    except Exception as exc:
+        return exc
+    return None
+
+
+def drain(sinks, batch_size=100, pool=None):
+    """
+    Claim and deliver one batch. Returns (delivered, failed) counts; (0, 0)
+    means nothing was due.
+    """
+    events = claim(batch_size)
+    if not events:
+        return 0, 0
+
+    if pool is None:
+        errors = [_deliver(sinks, event) for event in events]
+    else:
+        errors = list(pool.map(lambda event: _deliver(sinks, event), events))
+
+    now = timezone.now()
+    delivered = [event.pk for event, error in zip(events, errors) if error is None]
+    OutboxEvent.objects.filter(pk__in=delivered).update(status='Delivered', delivered_at=now)
+
+    for event, error in zip(events, errors):
+        if error is None:
+            continue
+        attempts = event.attempts + 1
+        logger.warning('outbox event %s failed (attempt %s): %s', event.pk, attempts, error)
+        OutboxEvent.objects.filter(pk=event.pk).update(
+            attempts=attempts,
+            last_error=repr(error)[:1000],
+            status='Failed' if attempts >= MAX_ATTEMPTS else 'Pending',
+            available_at=now + backoff(attempts),
+        )
+    return len(delivered), len(events) - len(delivered)
+
+
+def prune(before, batch_size=1000):
+    """
+    Delete events delivered before ``before``, at most batch_size per query.
+    Yields the number deleted after each batch. Failed events are kept for
+    inspection.
+    """
+    delivered = OutboxEvent.objects.filter(status='Delivered', delivered_at__lt=before).order_by('pk')
+    while True:
+        ids = list(delivered.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return
+        OutboxEvent.objects.filter(pk__in=ids).delete()
+        yield len(ids)
+
+
+def run(sinks, batch_size=100, workers=4, interval=1.0, once=False, stop=None):
+    # Drain until the outbox is empty, then poll every ``interval`` seconds
+    stop = stop or threading.Event()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='outbox') as pool:
+        while not stop.is_set():
+            delivered, failed = drain(sinks, batch_size, pool)
+            if delivered or failed:
+                logger.info('outbox: %s delivered, %s failed', delivered, failed)
+                continue
+            if once:
+                break
+            stop.wait(interval)
@@ -0,0 +1,57 @@
+from django.conf import settings
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+
+
+class StandardPagination(PageNumberPagination):
+    # ?page=N&page_size=M, capped so a client can't ask for the whole table
+    page_size_query_param = 'page_size'
+
+    @property
+    def max_page_size(self):
+        return settings.API_MAX_PAGE_SIZE
+
+
+class KeysetPagination(CursorPagination):
+    # Seeks on the primary key instead of OFFSET, so deep pages stay cheap
+    page_size_query_param = 'page_size'
+    ordering = '-pk'
+
+    @property
+    def max_page_size(self):
+        return settings.API_MAX_PAGE_SIZE
+
+
+class PageOrKeysetPagination(StandardPagination):
+    """
+    Page-number pagination by default; switches to keyset (cursor) paging when
+    the client sends ``?paging=cursor`` or follows a ``cursor`` link.
+    Used on the large append-only tables (Borrow, Review).
+    """
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self._wants_keyset(request, queryset):
+            self._keyset = self.keyset_class()
+            return self._keyset.paginate_queryset(queryset, request, view)
+        self._keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self._keyset is not None:
+            return self._keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self._keyset is not None:
+            return self._keyset.to_html()
+        return super().to_html()
+
+    def _wants_keyset(self, request, queryset):
+        # Grouped value rows (e.g. group_by_user) have no key to seek on
+        if queryset.query.values_select:
+            return False
+        params = request.query_params
+        return (
+            params.get('paging') == 'cursor'
+            or self.keyset_class.cursor_query_param in params
+        )
@@ -0,0 +1,120 @@
+"""
+Read-replica routing.
+
+With a 'replica' database configured, ReplicaRouter sends the reads of safe
+(GET/HEAD/OPTIONS) requests to it, so reports and listings don't compete with
+checkouts on the primary. Everything else reads from the primary:
+
+  * unsafe requests, and the rest of a request once it has written;
+  * requests from a user who wrote within DATABASE_REPLICA_STICKY_SECONDS,
+    so a reader sees their own new borrow despite replication lag;
+  * cache builds right after a change (see caching.validators), since
+    whatever they read stays cached;
+  * users and token revocations, which authentication must see at once;
+  * code outside a request (management commands, workers).
+
+ReplicaRoutingMiddleware tracks this per request. The sticky window is kept
+in the Django cache, so with several processes use the file or redis cache.
+"""
+import contextvars
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import LazyObject
+
+PRIMARY = 'default'
+REPLICA = 'replica'
+STICKY_KEY = 'library:replica:sticky:{}'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PRIMARY_MODELS = {'library.user', 'library.tokenuser', 'library.tokenrevocation'}
+
+_state = contextvars.ContextVar('replica_routing', default=None)
+
+
+class RoutingState:
+    def __init__(self, request):
+        self.request = request
+        self.primary = request.method not in SAFE_METHODS
+        self.wrote = False
+        self.user_id = None
+
+
+def use_primary():
+    # Read from the primary for the rest of the current request
+    state = _state.get()
+    if state is not None:
+        state.primary = True
+
+
+def authenticated_user(request):
+    # The user set by DRF authentication (or the async views). Evaluating
+    # AuthenticationMiddleware's lazy session user would itself query.
+    user = request.__dict__.get('user')
+    if user is None or isinstance(user, LazyObject) or not user.is_authenticated:
+        return None
+    return user
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.primary or model._meta.label_lower in PRIMARY_MODELS:
+            return PRIMARY
+        if state.user_id is None:
+            user = authenticated_user(state.request)
+            if user is not None:
+                state.user_id = user.pk
+                if cache.get(STICKY_KEY.format(user.pk)):
+                    state.primary = True
+                    return PRIMARY
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = state.primary = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= {PRIMARY, REPLICA}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RoutingState(request)
+        token = _state.set(state)
+        try:
+            return self.get_response(request)
+        finally:
+            _state.reset(token)
+            self.finish(state)
+
+    async def __acall__(self, request):
+        state = RoutingState(request)
+        token = _state.set(state)
+        try:
+            return await self.get_response(request)
+        finally:
+            _state.reset(token)
+            self.finish(state)
+
+    def finish(self, state):
+        user = authenticated_user(state.request) if state.wrote else None
+        if user is not None:
+            cache.set(STICKY_KEY.format(user.pk), True, settings.DATABASE_REPLICA_STICKY_SECONDS)
@@ -0,0 +1,230 @@
+import bisect
+import re
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Book
+
+# Weight of a hit in each searchable field when ranking results
+FIELD_WEIGHTS = {'title': 4, 'author': 3, 'isbn': 3, 'category': 1}
+
+# An exact token hit outranks a prefix hit in the same field
+EXACT_BONUS = 2
+
+# Shared counter bumped on every catalog write so other processes notice.
+# It lives in the default cache, so with more than one process the 'memory'
+# backend needs a shared cache (CACHE_BACKEND=file or redis): under locmem
+# each process only sees its own writes.
+VERSION_KEY = 'library:search:version'
+
+# Matched ids per query when filtering them by status
+STATUS_BATCH_SIZE = 900
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall((text or '').lower())
+
+
+def _book_tokens(book):
+    # {token: summed field weight} for one book
+    tokens = defaultdict(int)
+    for field, weight in FIELD_WEIGHTS.items():
+        value = getattr(book, field) or ''
+        for token in set(tokenize(value)):
+            tokens[token] += weight
+    # ISBNs are also searchable without their hyphens
+    compact = re.sub(r'[^0-9xX]', '', book.isbn or '').lower()
+    if compact:
+        tokens[compact] = max(tokens[compact], FIELD_WEIGHTS['isbn'])
+    return tokens
+
+
+class InvertedIndex:
+    """
+    In-process token -> book postings with a sorted vocabulary for prefix
+    lookups. Kept current by the Book save/delete signals; rebuilt from the
+    database when another process has written since our last sync. Copy
+    status is not kept: circulation changes it with QuerySet.update(), which
+    sends no signals, so search_books() filters it in SQL.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)    # token -> {book_id: weight}
+        self._vocabulary = []                 # sorted tokens
+        self._documents = {}                  # book_id -> (tokens, category)
+        self._version = None
+
+    def _reset(self):
+        self._postings = defaultdict(dict)
+        self._vocabulary = []
+        self._documents = {}
+
+    def rebuild(self):
+        with self._lock:
+            self._reset()
+            # Read the version first so a write racing the rebuild forces another
+            version = cache.get_or_set(VERSION_KEY, 0, None)
+            books = Book.objects.only('book_id', *FIELD_WEIGHTS).iterator(chunk_size=2000)
+            for book in books:
+                self._add(book)
+            self._vocabulary = sorted(self._postings)
+            self._version = version
+
+    def _add(self, book, keep_sorted=False):
+        tokens = _book_tokens(book)
+        for token, weight in tokens.items():
+            if keep_sorted and token not in self._postings:
+                bisect.insort(self._vocabulary, token)
+            self._postings[token][book.book_id] = weight
+        self._documents[book.book_id] = (tuple(tokens), book.category)
+
+    def _remove(self, book_id):
+        document = self._documents.pop(book_id, None)
+        if document is None:
+            return
+        for token in document[0]:
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(book_id, None)
+            if not postings:
+                del self._postings[token]
+                index = bisect.bisect_left(self._vocabulary, token)
+                if index < len(self._vocabulary) and self._vocabulary[index] == token:
+                    del self._vocabulary[index]
+
+    def _touch(self):
+        # Record the write in the shared version; if nobody else wrote in
+        # between we are still in sync, otherwise rebuild on next search.
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, 1, None)
+            version = 1
+        if self._version is not None and version == self._version + 1:
+            self._version = version
+        else:
+            self._version = None
+
+    def update(self, book):
+        with self._lock:
+            if self._version is not None:
+                self._remove(book.book_id)
+                self._add(book, keep_sorted=True)
+            self._touch()
+
+    def delete(self, book_id):
+        with self._lock:
+            if self._version is not None:
+                self._remove(book_id)
+            self._touch()
+
+    def invalidate(self):
+        # For bulk writes that skip the signals: every process rebuilds on next search
+        with self._lock:
+            self._version = None
+            self._touch()
+
+    def _ensure_current(self):
+        if self._version is None or cache.get(VERSION_KEY) != self._version:
+            self.rebuild()
+
+    def _prefix_matches(self, term):
+        # Every vocabulary token starting with term, via binary search. Index
+        # the list rather than slice it: a slice copies the rest of it.
+        vocabulary = self._vocabulary
+        for i in range(bisect.bisect_left(vocabulary, term), len(vocabulary)):
+            token = vocabulary[i]
+            if not token.startswith(term):
+                break
+            yield token
+
+    def search(self, terms, category=None):
+        with self._lock:
+            self._ensure_current()
+            scores = None
+            for term in terms:
+                term_scores = {}
+                for token in self._prefix_matches(term):
+                    bonus = EXACT_BONUS if token == term else 1
+                    for book_id, weight in self._postings[token].items():
+                        score = weight * bonus
+                        if score > term_scores.get(book_id, 0):
+                            term_scores[book_id] = score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    # Every term has to match
+                    scores = {
+                        book_id: score + term_scores[book_id]
+                        for book_id, score in scores.items() if book_id in term_scores
+                    }
+                if not scores:
+                    return []
+
+            results = []
+            for book_id, score in scores.items():
+                _, book_category = self._documents[book_id]
+                if category and book_category != category:
+                    continue
+                results.append((-score, book_id))
+            results.sort()
+            return [book_id for _, book_id in results]
+
+
+index = InvertedIndex()
+
+
+def use_fulltext():
+    backend = settings.SEARCH_BACKEND
+    if backend == 'auto':
+        return connection.vendor == 'mysql'
+    return backend == 'fulltext'
+
+
+def _fulltext_search(terms, status=None, category=None):
+    # MySQL FULLTEXT (see migration 0003) in boolean mode: all terms required, prefix matched
+    expression = ' '.join(f'+{term}*' for term in terms)
+    relevance = RawSQL(
+        'MATCH (title, author, isbn, category) AGAINST (%s IN BOOLEAN MODE)', (expression,)
+    )
+    queryset = Book.objects.annotate(relevance=relevance).filter(relevance__gt=0)
+    if status:
+        queryset = queryset.filter(status=status)
+    if category:
+        queryset = queryset.filter(category=category)
+    return queryset.order_by('-relevance', 'book_id').values_list('book_id', flat=True)
+
+
+def _with_status(book_ids, status):
+    # The matches (in order) whose copy currently has status, read from the database
+    matching = set()
+    for start in range(0, len(book_ids), STATUS_BATCH_SIZE):
+        batch = book_ids[start:start + STATUS_BATCH_SIZE]
+        matching.update(Book.objects.filter(pk__in=batch, status=status).values_list('pk', flat=True))
+    return [book_id for book_id in book_ids if book_id in matching]
+
+
+def search_books(query, status=None, category=None):
+    """
+    Return book ids matching every word of ``query`` (prefix match), most
+    relevant first. The result is a sliceable sequence so it can be handed
+    straight to the paginator.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return []
+    if use_fulltext():
+        return _fulltext_search(terms, status, category)
+    book_ids = index.search(terms, category)
+    if status:
+        book_ids = _with_status(book_ids, status)
+    return book_ids
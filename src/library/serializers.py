@@ -1,5 +1,33 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import User, Reader, Librarian, LibraryCard, Book, Borrow, Reserve, Review
+from .models import User, Reader, Librarian, LibraryCard, Edition, Book, Borrow, Reserve, Review
+
+class ExpandableSerializerMixin:
+    # ?expand=book,user swaps the listed foreign key ids for nested objects.
+    # The view puts the requested names in context['expand'] and select_related()s them.
+    expandable_fields = {}
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        for field in self.context.get('expand', ()):
+            serializer_class = self.expandable_fields.get(field)
+            if serializer_class is None or field not in data:
+                continue
+            related = getattr(instance, field)
+            # ?fields= names the outer object's fields, not the nested one's
+            context = {**self.context, 'fields': None}
+            data[field] = serializer_class(related, context=context).data if related else None
+        return data
+
+class SparseFieldsMixin:
+    # ?fields=book_id,title keeps only the listed fields (unknown names are ignored).
+    # The view puts the requested names in context['fields'] for reads.
+    def get_fields(self):
+        fields = super().get_fields()
+        wanted = self.context.get('fields')
+        if wanted:
+            fields = {name: field for name, field in fields.items() if name in wanted}
+        return fields
 
 class UserSerializer(serializers.ModelSerializer):
     # handle password correctly and securely
@@ -39,25 +67,69 @@ class LibraryCardSerializer(serializers.ModelSerializer):
         fields = ['card_id', 'user', 'user_email']
         read_only_fields = ['user_email']
 
-class BookSerializer(serializers.ModelSerializer):
+class EditionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    average_rating = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Edition
+        fields = [
+            'edition_id', 'isbn', 'title', 'author', 'total_copies', 'available_copies',
+            'review_count', 'rating_sum', 'average_rating',
+        ]
+        read_only_fields = fields
+
+class RatingSummarySerializer(serializers.ModelSerializer):
+    average_rating = serializers.FloatField(read_only=True)
+    histogram = serializers.DictField(source='rating_histogram', child=serializers.IntegerField(), read_only=True)
+
+    class Meta:
+        model = Edition
+        fields = ['isbn', 'review_count', 'average_rating', 'histogram']
+        read_only_fields = fields
+
+class BookSerializer(SparseFieldsMixin, ExpandableSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {'edition': EditionSerializer}
+
     class Meta:
         model = Book
         fields = '__all__'
 
-class BorrowSerializer(serializers.ModelSerializer):
+class BorrowSerializer(SparseFieldsMixin, ExpandableSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {'book': BookSerializer, 'user': UserSerializer}
+
     class Meta:
         model = Borrow
         fields = '__all__'
         read_only_fields = ['borrow_id', 'delay_status', 'user', 'return_date']
 
-class ReserveSerializer(serializers.ModelSerializer):
+class BorrowHistorySerializer(BorrowSerializer):
+    # ?history=full rows: True for loans read from the archive
+    archived = serializers.BooleanField(read_only=True)
+
+class ReserveSerializer(SparseFieldsMixin, ExpandableSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {'edition': EditionSerializer, 'user': UserSerializer}
+
     class Meta:
         model = Reserve
         fields = '__all__'
-        read_only_fields = ['reserve_id', 'user']
+        read_only_fields = ['reserve_id', 'user', 'status', 'held_book', 'hold_expires_at']
+
+class ReviewSerializer(SparseFieldsMixin, ExpandableSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {'edition': EditionSerializer, 'user': UserSerializer}
 
-class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = Review
         fields = '__all__'
-        read_only_fields = ['review_id']
\ No newline at end of file
+        read_only_fields = ['review_id']
+
+class BulkReturnSerializer(serializers.Serializer):
+    borrow_ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=settings.CIRCULATION_BULK_LIMIT
+    )
+
+class BulkCheckoutSerializer(serializers.Serializer):
+    user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
+    book_ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=settings.CIRCULATION_BULK_LIMIT
+    )
+    due_date = serializers.DateField(required=False)
@@ -0,0 +1,391 @@
+"""
+Circulation state transitions (borrow, return, fulfill, cancel, holds).
+
+Every transition claims its rows with a conditional UPDATE (``... WHERE
+status = <expected>``) inside ``transaction.atomic``, so two concurrent
+requests can never both move the same copy or reservation. Picking "any
+available copy" uses ``SELECT ... FOR UPDATE SKIP LOCKED`` where the
+database supports it, letting parallel fulfills grab distinct copies
+instead of queueing on the same row.
+
+Reservations form a FIFO hold queue per ISBN. A copy that comes back (or
+whose hold lapses) goes to the oldest pending reservation, is marked
+'Reserved' and kept for HOLD_DAYS; only that reader can then borrow it.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.utils import timezone
+
+from .models import Edition, Book, Borrow, OpenLoan, OutboxEvent, Reserve
+from . import caching
+
+# Default loan period for fulfilled reservations
+LOAN_DAYS = 14
+
+# Pickup window for a copy set aside for a reservation
+HOLD_DAYS = 3
+
+# How many candidate copies to try per round when SKIP LOCKED is unavailable
+CLAIM_BATCH = 10
+
+
+class CirculationError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def loan_event(kind, user_id, borrow_id, book_id, due_date, key=None, **extra):
+    # (kind, user_id, key, payload) tuple for OutboxEvent.objects.emit_many()
+    payload = {'borrow_id': borrow_id, 'book_id': book_id, 'due_date': due_date.isoformat(), **extra}
+    return kind, user_id, key, payload
+
+
+def _set_copy_status(book_id, from_status, to_status):
+    # True if this call moved the copy; False if someone else got there first
+    return Book.objects.filter(pk=book_id, status=from_status).update(status=to_status) == 1
+
+
+def _holds_by_copy(book_ids):
+    # {book_id: (reserve_id, user_id)} for copies currently held for a reader
+    return {
+        book_id: (reserve_id, user_id)
+        for reserve_id, user_id, book_id in Reserve.objects.filter(held_book__in=book_ids, status='Ready')
+        .values_list('reserve_id', 'user_id', 'held_book_id')
+    }
+
+
+def claim_copy(book, user_id=None):
+    """
+    Mark a specific copy as borrowed by ``user_id``. A copy on hold can only
+    go to the reader it is held for, whose reservation is then fulfilled.
+    Must run inside ``transaction.atomic`` together with the write that
+    records the loan.
+    """
+    if _set_copy_status(book.pk, 'Available', 'Borrowed'):
+        from_status = 'Available'
+    else:
+        hold = _holds_by_copy([book.pk]).get(book.pk)
+        if hold is not None and hold[1] != user_id:
+            raise CirculationError('This copy is on hold for another reader.')
+        if not _set_copy_status(book.pk, 'Reserved', 'Borrowed'):
+            raise CirculationError('This book is already borrowed.')
+        if hold is not None:
+            Reserve.objects.filter(pk=hold[0], status='Ready').update(status='Fulfilled')
+        from_status = 'Reserved'
+
+    Edition.objects.copy_status_changed(book.edition_id, from_status, 'Borrowed')
+    book.stored(status='Borrowed')
+    return book
+
+
+def claim_available_copy(isbn, to_status='Borrowed'):
+    """
+    Take one available copy of ``isbn`` and move it to ``to_status``, or
+    return None. Must run inside ``transaction.atomic``.
+    """
+    available = Book.objects.filter(isbn=isbn, status='Available').order_by('book_id')
+
+    if connection.features.has_select_for_update_skip_locked:
+        # Rows locked by concurrent fulfills are skipped, not waited on
+        book = available.select_for_update(skip_locked=True).first()
+        if book is None:
+            return None
+        _set_copy_status(book.pk, 'Available', to_status)
+    else:
+        book = None
+        while book is None:
+            candidates = list(available[:CLAIM_BATCH])
+            if not candidates:
+                return None
+            book = next((c for c in candidates if _set_copy_status(c.pk, 'Available', to_status)), None)
+
+    Edition.objects.copy_status_changed(book.edition_id, 'Available', to_status)
+    book.stored(status=to_status)
+    return book
+
+
+def hold_for_next(book_id, isbn):
+    """
+    Give copy ``book_id`` to the oldest pending reservation of ``isbn``:
+    the reservation becomes Ready with a pickup deadline. Returns the
+    reservation, or None if nobody is waiting. The caller sets the copy's
+    status; must run inside ``transaction.atomic``.
+    """
+    queue = Reserve.objects.filter(isbn=isbn, status='Pending').order_by('reserve_id')
+    expires = timezone.now() + timedelta(days=HOLD_DAYS)
+    while True:
+        if connection.features.has_select_for_update_skip_locked:
+            # A reservation locked by a concurrent cancel/allocation is passed over
+            candidates = list(queue.select_for_update(skip_locked=True)[:1])
+        else:
+            candidates = list(queue[:CLAIM_BATCH])
+        if not candidates:
+            return None
+        for reservation in candidates:
+            if Reserve.objects.filter(pk=reservation.pk, status='Pending').update(
+                    status='Ready', held_book_id=book_id, hold_expires_at=expires):
+                reservation.status, reservation.held_book_id, reservation.hold_expires_at = 'Ready', book_id, expires
+                OutboxEvent.objects.emit('reservation.ready', reservation.user_id, reserve_id=reservation.pk,
+                                         isbn=isbn, book_id=book_id, hold_expires_at=expires.isoformat())
+                return reservation
+
+
+def release_copy(book):
+    """
+    A copy came back or its hold lapsed: hold it for the next reader in the
+    queue, or put it back on the shelf. Must run inside ``transaction.atomic``.
+    """
+    old_status = book.status
+    reservation = hold_for_next(book.pk, book.isbn)
+    new_status = 'Reserved' if reservation else 'Available'
+    if Book.objects.filter(pk=book.pk).exclude(status=new_status).update(status=new_status):
+        Edition.objects.copy_status_changed(book.edition_id, old_status, new_status)
+    book.stored(status=new_status)
+    # QuerySet.update() sends no signals
+    caching.touch('book')
+    return reservation
+
+
+def fill_holds(isbn):
+    # Set available copies of isbn aside for waiting readers, oldest first
+    held = []
+    while True:
+        book = claim_available_copy(isbn, to_status='Reserved')
+        if book is None:
+            break
+        reservation = hold_for_next(book.pk, isbn)
+        if reservation is None:
+            # Nobody waiting after all: back on the shelf
+            _set_copy_status(book.pk, 'Reserved', 'Available')
+            Edition.objects.copy_status_changed(book.edition_id, 'Reserved', 'Available')
+            book.stored(status='Available')
+            break
+        held.append(reservation)
+    if held:
+        caching.touch('book')
+    return held
+
+
+def return_borrow(borrow):
+    # Close the loan and put the copy back on the shelf
+    today = timezone.now().date()
+    with transaction.atomic():
+        closed = Borrow.objects.filter(pk=borrow.pk, return_date__isnull=True).update(
+            return_date=today,
+            delay_status=ExpressionWrapper(Q(due_date__lt=today), output_field=BooleanField()),
+        )
+        if not closed:
+            raise CirculationError('Book already marked as returned.')
+        OpenLoan.objects.close([borrow.pk])
+        OutboxEvent.objects.emit_many([loan_event(
+            'loan.returned', borrow.user_id, borrow.pk, borrow.book_id, borrow.due_date, late=today > borrow.due_date,
+        )])
+
+        release_copy(borrow.book)
+
+    borrow.return_date = today
+    borrow.delay_status = today > borrow.due_date
+    return borrow
+
+
+def return_many(borrow_ids):
+    """
+    Return a cart of loans with a fixed number of set-based queries.
+    Returns {borrow_id: 'returned' | 'already_returned' | 'not_found'}.
+    """
+    today = timezone.now().date()
+    with transaction.atomic():
+        rows = {
+            borrow_id: (returned, book_id, user_id, due_date)
+            for borrow_id, returned, book_id, user_id, due_date in Borrow.objects.select_for_update()
+            .filter(pk__in=borrow_ids).values_list('borrow_id', 'return_date', 'book_id', 'user_id', 'due_date')
+        }
+        open_ids = [pk for pk, (returned, *_) in rows.items() if returned is None]
+        if open_ids:
+            Borrow.objects.filter(pk__in=open_ids, return_date__isnull=True).update(
+                return_date=today,
+                delay_status=ExpressionWrapper(Q(due_date__lt=today), output_field=BooleanField()),
+            )
+            OpenLoan.objects.close(open_ids)
+            OutboxEvent.objects.emit_many([
+                loan_event('loan.returned', user_id, pk, book_id, due_date, late=today > due_date)
+                for pk, (_, book_id, user_id, due_date) in ((pk, rows[pk]) for pk in open_ids)
+            ])
+
+            # Copies coming back: held for the next reader where a queue exists,
+            # otherwise back on the shelf (counted per edition)
+            returning = list(
+                Book.objects.select_for_update()
+                .filter(pk__in={rows[pk][1] for pk in open_ids})
+                .exclude(status='Available').values_list('book_id', 'edition_id', 'isbn')
+            )
+            waiting = set(
+                Reserve.objects.filter(isbn__in={isbn for _, _, isbn in returning}, status='Pending')
+                .values_list('isbn', flat=True).distinct()
+            )
+            held = set()
+            for book_id, _, isbn in returning:
+                if isbn in waiting:
+                    if hold_for_next(book_id, isbn):
+                        held.add(book_id)
+                    else:
+                        waiting.discard(isbn)
+            shelved = [(book_id, edition_id) for book_id, edition_id, _ in returning if book_id not in held]
+            Book.objects.filter(pk__in=[book_id for book_id, _ in shelved]).update(status='Available')
+            Book.objects.filter(pk__in=held).update(status='Reserved')
+            Edition.objects.adjust_many('available_copies', Counter(e for _, e in shelved))
+            caching.touch('book')
+
+    results = {}
+    for pk in borrow_ids:
+        if pk not in rows:
+            results[pk] = 'not_found'
+        else:
+            results[pk] = 'returned' if rows[pk][0] is None else 'already_returned'
+    return results
+
+
+def checkout_many(user_id, book_ids, due_date=None):
+    """
+    Lend a cart of copies to one reader in one transaction.
+    Returns {book_id: (result, borrow_id)} with result 'borrowed' |
+    'unavailable' | 'not_found'.
+    """
+    today = timezone.now().date()
+    due_date = due_date or today + timedelta(days=LOAN_DAYS)
+    with transaction.atomic():
+        copies = {
+            book_id: (status, edition_id)
+            for book_id, status, edition_id in Book.objects.select_for_update()
+            .filter(pk__in=book_ids).values_list('book_id', 'status', 'edition_id')
+        }
+        # Copies on hold may only go to the reader they are held for
+        holds = _holds_by_copy(list(copies))
+        claimable = [
+            pk for pk, (status, _) in copies.items()
+            if status != 'Borrowed' and (pk not in holds or holds[pk][1] == user_id)
+        ]
+        borrow_ids = {}
+        if claimable:
+            Reserve.objects.filter(pk__in=[holds[pk][0] for pk in claimable if pk in holds]).update(status='Fulfilled')
+            Book.objects.filter(pk__in=claimable).exclude(status='Borrowed').update(status='Borrowed')
+            taken = Counter(edition for status, edition in map(copies.get, claimable) if status == 'Available')
+            Edition.objects.adjust_many('available_copies', {e: -n for e, n in taken.items()})
+
+            created = Borrow.objects.bulk_create([
+                Borrow(user_id=user_id, book_id=pk, borrow_date=today, due_date=due_date)
+                for pk in claimable
+            ])
+            borrow_ids = {borrow.book_id: borrow.pk for borrow in created}
+            if None in borrow_ids.values():
+                # MySQL doesn't return ids from bulk inserts; each claimed copy has one open loan
+                borrow_ids = dict(
+                    Borrow.objects.filter(book_id__in=claimable, return_date__isnull=True)
+                    .values_list('book_id', 'borrow_id')
+                )
+            OpenLoan.objects.bulk_create([
+                OpenLoan(borrow_id=pk, user_id=user_id, due_date=due_date) for pk in borrow_ids.values()
+            ])
+            OutboxEvent.objects.emit_many([
+                loan_event('loan.created', user_id, pk, book_id, due_date) for book_id, pk in borrow_ids.items()
+            ])
+            caching.touch('book')
+
+    results = {}
+    for pk in book_ids:
+        if pk not in copies:
+            results[pk] = ('not_found', None)
+        elif pk in borrow_ids:
+            results[pk] = ('borrowed', borrow_ids[pk])
+        else:
+            results[pk] = ('unavailable', None)
+    return results
+
+
+def fulfill_reservation(reservation):
+    # Lend the copy held for a ready reservation, or any available copy for a pending one
+    with transaction.atomic():
+        status, held_book_id = Reserve.objects.filter(pk=reservation.pk).values_list(
+            'status', 'held_book_id').first() or (None, None)
+        if status not in ('Pending', 'Ready') or not Reserve.objects.filter(
+                pk=reservation.pk, status=status).update(status='Fulfilled'):
+            raise CirculationError('Reservation already processed.')
+
+        if status == 'Ready':
+            book = Book.objects.filter(pk=held_book_id).first()
+            if book is None or not _set_copy_status(book.pk, 'Reserved', 'Borrowed'):
+                # Rolls back the reservation claim above
+                raise CirculationError('The held copy is no longer available.')
+            book.stored(status='Borrowed')
+        else:
+            book = claim_available_copy(reservation.isbn)
+            if book is None:
+                raise CirculationError('No available copy for this ISBN.')
+
+        today = timezone.now().date()
+        borrow = Borrow.objects.create(
+            user_id=reservation.user_id,
+            book=book,
+            borrow_date=today,
+            due_date=today + timedelta(days=LOAN_DAYS),
+        )
+        OutboxEvent.objects.emit_many([loan_event(
+            'reservation.fulfilled', borrow.user_id, borrow.pk, book.pk, borrow.due_date,
+            reserve_id=reservation.pk, isbn=reservation.isbn,
+        )])
+
+    reservation.status = 'Fulfilled'
+    return borrow
+
+
+def cancel_reservation(reservation):
+    # Canceling a ready hold passes its copy on to the next reader
+    with transaction.atomic():
+        held_book = reservation.held_book if reservation.status == 'Ready' else None
+        if reservation.status not in ('Pending', 'Ready') or not Reserve.objects.filter(
+                pk=reservation.pk, status=reservation.status).update(status='Canceled'):
+            raise CirculationError('Only pending or ready reservations can be canceled.')
+        if held_book is not None:
+            release_copy(held_book)
+    reservation.status = 'Canceled'
+    return reservation
+
+
+def expire_holds(now=None, batch_size=100):
+    """
+    Expire ready holds whose pickup window has passed, handing each copy to
+    the next reader in its queue. One transaction per hold. Returns the
+    number expired.
+    """
+    now = now or timezone.now()
+    stale = Reserve.objects.filter(status='Ready', hold_expires_at__lt=now).order_by('hold_expires_at')
+    expired = 0
+    while True:
+        batch = list(stale.select_related('held_book')[:batch_size])
+        if not batch:
+            return expired
+        for reservation in batch:
+            with transaction.atomic():
+                if not Reserve.objects.filter(pk=reservation.pk, status='Ready').update(status='Expired'):
+                    continue
+                OutboxEvent.objects.emit('reservation.expired', reservation.user_id,
+                                         reserve_id=reservation.pk, isbn=reservation.isbn)
+                if reservation.held_book is not None:
+                    release_copy(reservation.held_book)
+            expired += 1
+
+
+def fill_waiting_holds():
+    # Safety net for copies that reached the shelf around the queue (imports, edits)
+    isbns = Edition.objects.filter(available_copies__gt=0, reserves__status='Pending').values_list(
+        'isbn', flat=True).distinct()
+    held = 0
+    for isbn in list(isbns):
+        with transaction.atomic():
+            held += len(fill_holds(isbn))
+    return held
@@ -0,0 +1,61 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import User, TokenUser, Book, Borrow, Reserve, Review, Tombstone
+from . import archive, authentication, caching, search
+
+
+@receiver(post_save, sender=Book)
+def index_book(sender, instance, **kwargs):
+    # Keep the in-process catalog search index current
+    search.index.update(instance)
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book(sender, instance, **kwargs):
+    search.index.delete(instance.book_id)
+
+
+@receiver([post_save, post_delete], sender=Book)
+@receiver([post_save, post_delete], sender=Borrow)
+def book_changed(sender, **kwargs):
+    # Loans move copy status, so they invalidate cached book responses too
+    if sender is Borrow and archive.moving():
+        return
+    caching.touch('book')
+
+
+@receiver([post_save, post_delete], sender=Review)
+def review_changed(sender, **kwargs):
+    caching.touch('review')
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Borrow)
+@receiver(post_delete, sender=Reserve)
+@receiver(post_delete, sender=Review)
+def leave_tombstone(sender, instance, **kwargs):
+    # Lets changes-feed clients drop the row from their copy. Archived
+    # loans still happened, so moving them leaves none.
+    if archive.moving():
+        return
+    user_id = instance.user_id if sender in (Borrow, Reserve) else None
+    Tombstone.objects.create(kind=sender._meta.model_name, object_id=instance.pk, user_id=user_id)
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=TokenUser)
+def user_claims_changed(sender, instance, raw=False, **kwargs):
+    # Issued tokens carry email and role; a change (or deactivation) revokes them
+    if raw or instance._state.adding:
+        return
+    fields = [f for f in (*authentication.CLAIM_FIELDS, 'is_active') if f not in instance.get_deferred_fields()]
+    previous = User.objects.filter(pk=instance.pk).values(*fields).first()
+    if previous and any(previous[f] != getattr(instance, f) for f in fields):
+        authentication.revoke_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=TokenUser)
+def user_changed(sender, instance, **kwargs):
+    authentication.user_cache.discard(instance.pk)
@@ -0,0 +1,49 @@
+"""
+Query-count helpers for tests and CI checks.
+
+    with assert_max_queries(4):
+        client.get('/api/borrows/?expand=book,user')
+
+    assert_queries_constant(lambda: client.get(url), grow=lambda: add_rows(50))
+"""
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+def _describe(queries):
+    return '\n'.join(f"  {i}. {query['sql']}" for i, query in enumerate(queries, start=1))
+
+
+@contextmanager
+def assert_max_queries(limit, using=DEFAULT_DB_ALIAS):
+    # Fails if the block runs more than ``limit`` queries, listing them
+    with CaptureQueriesContext(connections[using]) as context:
+        yield context
+    if len(context) > limit:
+        raise AssertionError(
+            f'{len(context)} queries executed, expected at most {limit}:\n{_describe(context.captured_queries)}'
+        )
+
+
+def count_queries(func, using=DEFAULT_DB_ALIAS):
+    with CaptureQueriesContext(connections[using]) as context:
+        func()
+    return len(context), context.captured_queries
+
+
+def assert_queries_constant(func, grow, using=DEFAULT_DB_ALIAS):
+    """
+    N+1 check: run ``func``, call ``grow()`` to add rows, run ``func`` again.
+    The query count must not change with the number of rows returned.
+    Returns the (constant) count.
+    """
+    before, _ = count_queries(func, using)
+    grow()
+    after, queries = count_queries(func, using)
+    if after != before:
+        raise AssertionError(
+            f'query count grew from {before} to {after} with more rows (N+1?):\n{_describe(queries)}'
+        )
+    return after
@@ -0,0 +1,92 @@
+import io
+import json
+from datetime import date, timedelta
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import archive, async_views, outbox, views
+from .authentication import issue_tokens
+from .models import User, Book, Borrow, ArchivedBorrow, OutboxEvent
+
+
+class ArchivedStatsTests(TestCase):
+    # Archiving moves loans between tables; the stats totals must not move with them
+
+    def setUp(self):
+        self.librarian = User.objects.create_user('librarian@example.com', 'pw', role='Librarian')
+        self.reader = User.objects.create_user('reader@example.com', 'pw')
+        book = Book.objects.create(title='Title', author='Author', isbn='isbn-1', status='Available',
+                                   category='Fiction', shelf_loc='A1')
+        today = date.today()
+        old = today - timedelta(days=400)
+        Borrow.objects.create(user=self.reader, book=book, borrow_date=old, due_date=old + timedelta(days=14),
+                              return_date=old + timedelta(days=7))
+        # archive_returned() never moves the newest loan
+        Borrow.objects.create(user=self.reader, book=book, borrow_date=today, due_date=today + timedelta(days=14))
+        self.token = issue_tokens(self.librarian)['access']
+
+    def sync_stats(self, path):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        response = client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['borrows']
+
+    def async_stats(self, view, fallback, **kwargs):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        response = async_to_sync(view)(request, fallback=fallback, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)['borrows']
+
+    def all_stats(self):
+        cache.clear()
+        return [
+            self.sync_stats('/api/stats/'),
+            self.sync_stats(f'/api/stats/users/{self.reader.pk}/'),
+            self.async_stats(async_views.library_stats, views.library_stats),
+            self.async_stats(async_views.user_stats, views.user_stats, user_id=self.reader.pk),
+        ]
+
+    def test_archiving_keeps_borrow_totals(self):
+        before = self.all_stats()
+        self.assertEqual([stats['total'] for stats in before], [2, 2, 2, 2])
+
+        moved = sum(archive.archive_returned(date.today() - timedelta(days=30)))
+        self.assertEqual(moved, 1)
+        self.assertEqual(ArchivedBorrow.objects.count(), 1)
+        self.assertEqual(self.all_stats(), before)
+
+
+class PruneOutboxTests(TestCase):
+
+    def test_deletes_only_old_delivered_events(self):
+        user = User.objects.create_user('reader@example.com', 'pw')
+        now = timezone.now()
+        old = now - timedelta(days=10)
+        for delivered_at in (old, old, old, now):
+            OutboxEvent.objects.create(kind='loan.created', user=user, status='Delivered', delivered_at=delivered_at)
+        kept = [
+            OutboxEvent.objects.create(kind='loan.created', user=user, status='Delivered', delivered_at=now).pk,
+            OutboxEvent.objects.create(kind='loan.created', user=user, status='Failed', attempts=8).pk,
+            OutboxEvent.objects.create(kind='loan.created', user=user).pk,
+        ]
+        OutboxEvent.objects.filter(pk__in=kept[1:]).update(created_at=old, available_at=old)
+
+        call_command('prune_outbox', days=7, batch_size=2, stdout=io.StringIO())
+
+        self.assertEqual(OutboxEvent.objects.filter(delivered_at__lt=now - timedelta(days=7)).count(), 0)
+        self.assertEqual(OutboxEvent.objects.count(), 4)
+        self.assertTrue(set(kept) <= set(OutboxEvent.objects.values_list('pk', flat=True)))
+
+    def test_prunes_in_batches(self):
+        user = User.objects.create_user('reader@example.com', 'pw')
+        old = timezone.now() - timedelta(days=10)
+        OutboxEvent.objects.bulk_create([
+            OutboxEvent(kind='loan.created', user=user, status='Delivered', delivered_at=old) for _ in range(5)
+        ])
+        self.assertEqual(list(outbox.prune(timezone.now(), batch_size=2)), [2, 2, 1])
@@ -0,0 +1,67 @@
+"""
+Token-bucket throttles for the login endpoint.
+
+Each client IP and each submitted email has a bucket of LOGIN_THROTTLE_RATES
+[scope][0] tokens, refilled at [scope][1] tokens per minute. An attempt
+takes one token; with none left the request gets 429 and a Retry-After
+header. The check runs before the view, so a flood is turned away before
+any password hashing. Buckets live in the Django cache: with the per-process
+locmem cache every worker keeps its own, and concurrent attempts may race
+for the last token, so treat the limits as approximate.
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+BUCKET_KEY = 'library:throttle:{}:{}'
+
+
+class TokenBucketThrottle(BaseThrottle):
+    scope = None
+
+    def get_ident_key(self, request):
+        # Identifier of the bucket, or None to let the request through
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        ident = self.get_ident_key(request)
+        if ident is None:
+            return True
+        capacity, per_minute = settings.LOGIN_THROTTLE_RATES[self.scope]
+        rate = per_minute / 60
+        key = BUCKET_KEY.format(self.scope, ident)
+        now = time.time()
+
+        tokens, updated = cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        # A bucket left alone until it is full again is the same as no bucket
+        cache.set(key, (tokens, now), math.ceil((capacity - tokens) / rate) + 1)
+        self.retry_after = None if allowed else (1 - tokens) / rate
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class LoginIPThrottle(TokenBucketThrottle):
+    scope = 'ip'
+
+    def get_ident_key(self, request):
+        return self.get_ident(request)
+
+
+class LoginEmailThrottle(TokenBucketThrottle):
+    scope = 'email'
+
+    def get_ident_key(self, request):
+        email = request.data.get('email')
+        if not isinstance(email, str) or not email.strip():
+            return None
+        return hashlib.sha1(email.strip().lower().encode()).hexdigest()
@@ -1,6 +1,7 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 from .views import overdue_users_summary, my_profile, update_profile
 
 router = DefaultRouter()
@@ -8,6 +9,7 @@ router.register(r'users', views.UserViewSet)
 router.register(r'readers', views.ReaderViewSet)
 router.register(r'librarians', views.LibrarianViewSet)
 router.register(r'library-cards', views.LibraryCardViewSet)
+router.register(r'editions', views.EditionViewSet)
 router.register(r'books', views.BookViewSet)
 router.register(r'borrows', views.BorrowViewSet)
 router.register(r'reserves', views.ReserveViewSet)
@@ -21,7 +23,21 @@ urlpatterns = [
     path('logout/', views.LogoutView.as_view(), name='logout'),
     # Mapping to list of users with overdue books
     path('overdue-users/', overdue_users_summary, name='overdue-users'),
+    # Mapping to streaming CSV/JSONL exports (books, borrows, reviews)
+    path('export/<str:table>/', views.ExportView.as_view(), name='export'),
+    # Mapping to the changes feed for incremental client sync
+    path('changes/', views.changes_feed, name='changes'),
+    # Mapping to aggregated dashboard statistics
+    path('stats/', views.library_stats, name='stats'),
+    path('stats/users/<int:user_id>/', views.user_stats, name='user-stats'),
+    path('stats/cache/', views.cache_stats, name='cache-stats'),
+    # Mapping to per-route request metrics (Prometheus text format)
+    path('metrics/', views.request_metrics, name='metrics'),
     # Mapping to user profile
     path('my-profile/', my_profile),
     path('my-profile/update/', update_profile),
-]
\ No newline at end of file
+]
+
+if settings.ASYNC_VIEWS:
+    # Async fast paths for the hottest reads, in front of the DRF routes they fall back to
+    urlpatterns = async_views.urlpatterns(router) + urlpatterns
@@ -2,22 +2,41 @@ from rest_framework import viewsets, permissions, status, serializers
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework.decorators import action, api_view, permission_classes
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.decorators import action, api_view, permission_classes, renderer_classes
+from rest_framework.parsers import MultiPartParser
 
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.utils import timezone
-from django.db.models import Q, Count
+from django.db.models import Q, Count, prefetch_related_objects
 from datetime import timedelta
+import hashlib
 
-from .models import User, Reader, Librarian, LibraryCard, Book, Borrow, Reserve, Review
+from .models import (
+    User, Reader, Librarian, LibraryCard, Edition, Book, Borrow, ArchivedBorrow, OpenLoan, OutboxEvent, Reserve,
+    Review, DUE_SOON_DAYS,
+)
 from .serializers import (
     UserSerializer, ReaderSerializer, LibrarianSerializer,
-    LibraryCardSerializer, BookSerializer, BorrowSerializer,
-    ReserveSerializer, ReviewSerializer
+    LibraryCardSerializer, EditionSerializer, BookSerializer, BorrowSerializer,
+    BorrowHistorySerializer, ReserveSerializer, ReviewSerializer, RatingSummarySerializer, BulkReturnSerializer, BulkCheckoutSerializer
 )
 
 from .permissions import IsLibrarian
+from .throttling import LoginIPThrottle, LoginEmailThrottle
+from .pagination import PageOrKeysetPagination
+from .search import search_books
+from . import caching
+from .authentication import issue_tokens, revoke_token
+from . import metrics
+from . import archive
+from . import bulk
+from . import changes
+from . import services
+from .services import CirculationError
 
 # -------------------------------
 # Authentication Views
@@ -31,19 +50,17 @@ class RegisterView(APIView):
         serializer = UserSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            refresh = RefreshToken.for_user(user)
             return Response({
                 "user": UserSerializer(user).data,
-                "tokens": {
-                    "refresh": str(refresh),
-                    "access": str(refresh.access_token),
-                }
+                "tokens": issue_tokens(user),
             }, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 class LoginView(APIView):
     permission_classes = [AllowAny]
+    # Checked before post(), so floods are rejected without hashing anything
+    throttle_classes = [LoginIPThrottle, LoginEmailThrottle]
 
     def post(self, request):
         # Authenticate user and return user info on success
@@ -52,40 +69,68 @@ class LoginView(APIView):
         user = authenticate(request, username=email, password=password)
 
         if user is not None:
-            refresh = RefreshToken.for_user(user)
             return Response({
                 "message": "Login successful",
                 "user": UserSerializer(user).data,
-                "tokens": {
-                    "refresh": str(refresh),
-                    "access": str(refresh.access_token),
-                }
+                "tokens": issue_tokens(user),
             }, status=status.HTTP_200_OK)
         return Response({"error": "Invalid email or password"}, status=status.HTTP_400_BAD_REQUEST)
 
 
 class LogoutView(APIView):
+    permission_classes = [IsAuthenticated]
+
     def post(self, request):
-        # Log out current user
-        logout(request)
+        # Revoke the access token this request was made with
+        revoke_token(request.auth)
         return Response({"message": "Logged out successfully"}, status=status.HTTP_200_OK)
 
+# -------------------------------
+# Shared ViewSet Helpers
+# -------------------------------
+
+class ExpandMixin:
+    # Relations a client may ask to inline with ?expand=a,b; only those are joined
+    expandable = ()
+
+    def get_expand(self):
+        requested = self.request.query_params.get('expand', '') if self.request else ''
+        return [name for name in dict.fromkeys(part.strip() for part in requested.split(','))
+                if name in self.expandable]
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = self.get_expand()
+        return context
+
+    def expand_queryset(self, queryset):
+        expand = self.get_expand()
+        return queryset.select_related(*expand) if expand else queryset
+
+class SparseFieldsViewMixin:
+    # ?fields=a,b trims read responses to those fields (see serializers.SparseFieldsMixin)
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request is not None and self.request.method == 'GET':
+            context['fields'] = list_param(self.request, 'fields')
+        return context
+
 # -------------------------------
 # User Model ViewSets
 # -------------------------------
 
 class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
+    queryset = User.objects.order_by('id')
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
 class ReaderViewSet(viewsets.ModelViewSet):
-    queryset = Reader.objects.all()
+    queryset = Reader.objects.select_related('user').order_by('user_id')
     serializer_class = ReaderSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
 class LibrarianViewSet(viewsets.ModelViewSet):
-    queryset = Librarian.objects.select_related('user').all()
+    queryset = Librarian.objects.select_related('user').order_by('user_id')
     serializer_class = LibrarianSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
@@ -95,7 +140,7 @@ class LibrarianViewSet(viewsets.ModelViewSet):
 
 # Updated to allow librarians to view all cards & assign new card, readers to view own cards.
 class LibraryCardViewSet(viewsets.ModelViewSet):
-    queryset = LibraryCard.objects.all()
+    queryset = LibraryCard.objects.select_related('user').order_by('card_id')
     serializer_class = LibraryCardSerializer
 
     def get_permissions(self):
@@ -106,7 +151,7 @@ class LibraryCardViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_card(self, request):
         try:
-            card = LibraryCard.objects.get(user=request.user)
+            card = LibraryCard.objects.select_related('user').get(user=request.user)
             return Response(LibraryCardSerializer(card).data)
         except LibraryCard.DoesNotExist:
             return Response({"message": "You don't have a library card."}, status=404)
@@ -127,29 +172,179 @@ class LibraryCardViewSet(viewsets.ModelViewSet):
 # Book Management
 # -------------------------------
 
+# Most ISBNs (or book ids) one batch lookup may ask for
+BATCH_LOOKUP_LIMIT = 100
+
+
+def list_param(request, name):
+    # ?name=a,b,c and/or repeated ?name=: distinct values in request order
+    return list(dict.fromkeys(
+        item.strip() for value in request.query_params.getlist(name)
+        for item in value.split(',') if item.strip()
+    ))
+
+# Title-level view of the catalog: copy counts and rating totals per ISBN
+class EditionViewSet(caching.CachedResponseMixin, SparseFieldsViewMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Edition.objects.order_by('edition_id')
+    serializer_class = EditionSerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    lookup_field = 'isbn'
+    lookup_value_regex = '[^/]+'
+    cache_resources = ('review',)
+    cached_actions = ('ratings', 'batch_ratings')
+
+    @action(detail=True, methods=['get'])
+    def ratings(self, request, isbn=None):
+        # Review count, average and star histogram from the maintained counters
+        return Response(RatingSummarySerializer(self.get_object()).data)
+
+    @action(detail=False, methods=['get'], url_path='ratings')
+    def batch_ratings(self, request):
+        # ?isbn=a,b,c (or repeated ?isbn=): ratings for a whole catalog page in one query
+        isbns = list_param(request, 'isbn')
+        if not isbns:
+            return Response({"error": "isbn is required."}, status=400)
+        if len(isbns) > BATCH_LOOKUP_LIMIT:
+            return Response({"error": f"At most {BATCH_LOOKUP_LIMIT} ISBNs per request."}, status=400)
+
+        editions = {edition.isbn: edition for edition in Edition.objects.filter(isbn__in=isbns)}
+        # ISBNs without reviews or copies get an empty summary
+        summaries = [editions.get(isbn) or Edition(isbn=isbn) for isbn in isbns]
+        return Response({"results": RatingSummarySerializer(summaries, many=True).data})
+
 # Update BookViewSet to allow all users to view books and only librarians to modify
-class BookViewSet(viewsets.ModelViewSet):
-    queryset = Book.objects.all()
+class BookViewSet(caching.CachedResponseMixin, SparseFieldsViewMixin, ExpandMixin, viewsets.ModelViewSet):
+    queryset = Book.objects.order_by('book_id')
     serializer_class = BookSerializer
+    expandable = ('edition',)
+    cache_resources = ('book',)
+
+    def get_cache_resources(self):
+        # Expanded editions carry rating totals, which move with reviews
+        if 'edition' in self.get_expand():
+            return ('book', 'review')
+        return self.cache_resources
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'import_books']:
             return [IsLibrarian()]
         return [permissions.IsAuthenticatedOrReadOnly()]
-    
+
+    def get_queryset(self):
+        # Optional filtering by status and category
+        queryset = self.expand_queryset(Book.objects.order_by('book_id'))
+        status_filter = self.request.query_params.get('status')
+        category = self.request.query_params.get('category')
+
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+        if category:
+            queryset = queryset.filter(category=category)
+
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def availability(self, request):
+        # ?isbn=a,b and/or ?book=1,2: copies per status and pending holds of each title
+        isbns = list_param(request, 'isbn')
+        try:
+            book_ids = [int(book_id) for book_id in list_param(request, 'book')]
+        except ValueError:
+            return Response({"error": "book must be a list of book ids."}, status=400)
+        if not isbns and not book_ids:
+            return Response({"error": "isbn or book is required."}, status=400)
+        if len(isbns) + len(book_ids) > BATCH_LOOKUP_LIMIT:
+            return Response({"error": f"At most {BATCH_LOOKUP_LIMIT} ISBNs and book ids per request."}, status=400)
+
+        digest = hashlib.sha1(f'{isbns}{book_ids}'.encode()).hexdigest()
+        cache_key = f'library:availability:{digest}'
+        data = cache.get(cache_key)
+        if data is None:
+            books = dict(Book.objects.filter(pk__in=book_ids).values_list('book_id', 'isbn')) if book_ids else {}
+            wanted = list(dict.fromkeys([*isbns, *books.values()]))
+            found = {row['isbn']: row for row in Edition.objects.availability(wanted)}
+            empty = dict.fromkeys(('total_copies', 'available_copies', 'borrowed', 'reserved', 'pending_reservations'), 0)
+            data = {"results": [found.get(isbn) or {'isbn': isbn, **empty} for isbn in wanted]}
+            if book_ids:
+                # Unknown book ids are left out
+                data["books"] = {str(book_id): books[book_id] for book_id in book_ids if book_id in books}
+            cache.set(cache_key, data, settings.AVAILABILITY_CACHE_TTL)
+        return Response(data)
+
+    def list(self, request, *args, **kwargs):
+        query = request.query_params.get('search', '').strip()
+        if not query:
+            return super().list(request, *args, **kwargs)
+
+        # Indexed search returns ids by relevance; only the current page is loaded
+        ids = search_books(
+            query,
+            status=request.query_params.get('status'),
+            category=request.query_params.get('category'),
+        )
+        page = self.paginate_queryset(ids)
+        if page is not None:
+            return self.get_paginated_response(self._serialize_ids(page))
+        return Response(self._serialize_ids(ids))
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_books(self, request):
+        # Librarian uploads a CSV/JSONL 'file'; rows are validated and written in batches
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "Upload the catalog as 'file'."}, status=400)
+
+        file_format = request.query_params.get('file_format') or upload.name.rsplit('.', 1)[-1].lower()
+        if file_format not in bulk.FORMATS:
+            return Response({"error": f"file_format must be one of {', '.join(bulk.FORMATS)}."}, status=400)
+        try:
+            batch_size = int(request.query_params.get('batch_size', settings.IMPORT_BATCH_SIZE))
+        except ValueError:
+            return Response({"error": "batch_size must be an integer."}, status=400)
+        batch_size = max(1, min(batch_size, settings.IMPORT_BATCH_SIZE * 10))
+
+        report = bulk.import_books(bulk.read_rows(bulk.text_stream(upload), file_format), batch_size)
+        return Response(report.as_dict(), status=400 if report.error else 200)
+
+    def _serialize_ids(self, ids):
+        # Load the given books in one query, keeping the relevance order
+        ids = list(ids)
+        books = self.expand_queryset(Book.objects.all()).in_bulk(ids)
+        return self.get_serializer([books[i] for i in ids if i in books], many=True).data
+
+class ExportView(APIView):
+    # Streams books, borrows or reviews as CSV/JSONL without loading the table
+    permission_classes = [IsLibrarian]
+
+    def get(self, request, table):
+        model = bulk.EXPORT_MODELS.get(table)
+        if model is None:
+            return Response({"error": f"Unknown table '{table}'."}, status=404)
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in bulk.FORMATS:
+            return Response({"error": f"file_format must be one of {', '.join(bulk.FORMATS)}."}, status=400)
+
+        content_type = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(bulk.export_rows(model, file_format), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{table}.{file_format}"'
+        return response
+
 # -------------------------------
 # Borrowing Books
 # -------------------------------
 
-class BorrowViewSet(viewsets.ModelViewSet):
+class BorrowViewSet(SparseFieldsViewMixin, ExpandMixin, viewsets.ModelViewSet):
     queryset = Borrow.objects.all()
     serializer_class = BorrowSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = PageOrKeysetPagination
+    expandable = ('book', 'user')
 
     def get_queryset(self):
         # Librarians see all; readers see their own
         user = self.request.user
         qs = Borrow.objects.all() if user.role == 'Librarian' else Borrow.objects.filter(user=user)
+        qs = self.expand_queryset(qs.order_by('-borrow_id'))
 
         # Filters for librarians
         if user.role == 'Librarian':
@@ -159,96 +354,123 @@ class BorrowViewSet(viewsets.ModelViewSet):
 
             today = timezone.now().date()
 
+            # Both read the open-loan ledger rather than the whole borrow history
             if overdue == 'true':
-                qs = qs.filter(return_date__isnull=True, due_date__lt=today)
+                qs = qs.filter(pk__in=OpenLoan.objects.overdue(today).values('pk'))
 
             if due_soon == 'true':
-                soon = today + timedelta(days=3)
-                qs = qs.filter(return_date__isnull=True, due_date__range=[today, soon])
+                soon = today + timedelta(days=DUE_SOON_DAYS)
+                qs = qs.filter(pk__in=OpenLoan.objects.due_between(today, soon).values('pk'))
 
             if group_by_user == 'true':
-                return qs.values('user__email').distinct()
+                return qs.values('user__email').distinct().order_by('user__email')
 
         return qs
     
     def perform_create(self, serializer):
         book = serializer.validated_data['book']
 
-        if book.status == "Borrowed":
-            raise serializers.ValidationError({"book": "This book is already borrowed."})
-
-        # Mark book as borrowed
-        book.status = "Borrowed"
-        book.save()
-
-        # Create the borrow record
-        serializer.save(user=self.request.user)
+        try:
+            with transaction.atomic():
+                # Mark book as borrowed (fails if another request got it first)
+                services.claim_copy(book, self.request.user.pk)
+
+                # Create the borrow record and queue the reader's notification with it
+                borrow = serializer.save(user=self.request.user)
+                OutboxEvent.objects.emit_many([services.loan_event(
+                    'loan.created', borrow.user_id, borrow.pk, book.pk, borrow.due_date,
+                )])
+        except CirculationError as exc:
+            raise serializers.ValidationError({"book": exc.message})
 
     @action(detail=True, methods=['post'])
     def mark_returned(self, request, pk=None):
         # Librarian marks book as returned
         borrow = self.get_object()
 
-        if borrow.return_date:
-            return Response({"message": "Book already marked as returned."}, status=400)
+        try:
+            services.return_borrow(borrow)
+        except CirculationError as exc:
+            return Response({"message": exc.message}, status=exc.status)
 
-        borrow.return_date = timezone.now().date()
-        borrow.delay_status = borrow.return_date > borrow.due_date
+        return Response({"message": "Book marked as returned."}, status=200)
 
-        borrow.book.status = "Available"
-        borrow.book.save()
-        borrow.save()
+    @action(detail=False, methods=['post'], permission_classes=[IsLibrarian])
+    def bulk_return(self, request):
+        # Librarian checks in a cart of loans in one transaction
+        serializer = BulkReturnSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        borrow_ids = list(dict.fromkeys(serializer.validated_data['borrow_ids']))
 
-        return Response({"message": "Book marked as returned."}, status=200)
+        results = services.return_many(borrow_ids)
+        return Response({
+            "results": [{"borrow_id": pk, "result": result} for pk, result in results.items()],
+            "returned": sum(result == 'returned' for result in results.values()),
+        }, status=200)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsLibrarian])
+    def bulk_checkout(self, request):
+        # Librarian lends a cart of copies to one reader in one transaction
+        serializer = BulkCheckoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        book_ids = list(dict.fromkeys(data['book_ids']))
+
+        results = services.checkout_many(data['user'].pk, book_ids, data.get('due_date'))
+        return Response({
+            "results": [
+                {"book_id": pk, "result": result, "borrow_id": borrow_id}
+                for pk, (result, borrow_id) in results.items()
+            ],
+            "borrowed": sum(result == 'borrowed' for result, _ in results.values()),
+        }, status=200)
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_borrows(self, request):
-        # Reader can view their borrow history
-        borrows = Borrow.objects.filter(user=request.user).order_by('-borrow_date')
-        serializer = BorrowSerializer(borrows, many=True)
+        # Reader can view their borrow history; ?history=full adds archived loans
+        if request.query_params.get('history') == 'full':
+            return self.full_history(request)
+        borrows = self.expand_queryset(Borrow.objects.filter(user=request.user)).order_by('-borrow_date', '-borrow_id')
+        page = self.paginate_queryset(borrows)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        serializer = self.get_serializer(borrows, many=True)
         return Response(serializer.data)
 
-class ReserveViewSet(viewsets.ModelViewSet):
+    def full_history(self, request):
+        # Hot and archived loans in one list (page-number paging only)
+        rows = archive.full_history(request.user)
+        page = self.paginate_queryset(rows)
+        borrows = archive.as_borrows(page if page is not None else rows)
+        prefetch_related_objects(borrows, *self.get_expand())
+        data = BorrowHistorySerializer(borrows, many=True, context=self.get_serializer_context()).data
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+class ReserveViewSet(SparseFieldsViewMixin, ExpandMixin, viewsets.ModelViewSet):
     queryset = Reserve.objects.all()
     serializer_class = ReserveSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    expandable = ('edition', 'user')
 
     def get_queryset(self):
         # Librarians see all reservations; readers see only their own
+        queryset = self.expand_queryset(Reserve.objects.order_by('-reserve_id'))
         if self.request.user.role == 'Librarian':
-            return Reserve.objects.all()
-        return Reserve.objects.filter(user=self.request.user)
+            return queryset
+        return queryset.filter(user=self.request.user)
     
     @action(detail=True, methods=['post'], permission_classes=[IsLibrarian])
     def fulfill(self, request, pk=None):
         # Librarian fulfills a pending reservation by assigning an available book
         reservation = self.get_object()
 
-        if reservation.status != 'Pending':
-            return Response({'message': 'Reservation already processed.'}, status=400)
-
-        # Find an available book with the same ISBN
+        # Claims the reservation and an available copy of its ISBN atomically
         try:
-            book = Book.objects.filter(isbn=reservation.isbn, status='Available').first()
-            if not book:
-                return Response({'message': 'No available copy for this ISBN.'}, status=400)
-        except Book.DoesNotExist:
-            return Response({'message': 'No such book found.'}, status=404)
-
-        # Update reservation and book status
-        reservation.status = 'Fulfilled'
-        reservation.save()
-
-        book.status = 'Borrowed'
-        book.save()
-
-        # Create borrow record for the user
-        borrow = Borrow.objects.create(
-            user=reservation.user,
-            book=book,
-            borrow_date=timezone.now().date(),
-            due_date=timezone.now().date() + timedelta(days=14)  # default 2-week loan
-        )
+            borrow = services.fulfill_reservation(reservation)
+        except CirculationError as exc:
+            return Response({'message': exc.message}, status=exc.status)
 
         return Response({
             'message': 'Reservation fulfilled and borrow record created.',
@@ -259,37 +481,67 @@ class ReserveViewSet(viewsets.ModelViewSet):
     def cancel(self, request, pk=None):
         # Librarian cancels a pending reservation
         reservation = self.get_object()
-        if reservation.status != 'Pending':
-            return Response({'message': 'Only pending reservations can be canceled.'}, status=400)
-
-        reservation.status = 'Canceled'
-        reservation.save()
+        try:
+            services.cancel_reservation(reservation)
+        except CirculationError as exc:
+            return Response({'message': exc.message}, status=exc.status)
 
         return Response({'message': 'Reservation canceled.'})
 
+    @action(detail=True, methods=['get'])
+    def position(self, request, pk=None):
+        # Place in the hold queue: pending reservations of the same ISBN placed earlier.
+        # A range count on the (isbn, status, reserve_id) index, so it reads one
+        # index entry per reservation ahead; cancellations anywhere in the queue
+        # keep an exact stored rank from being cheaper to maintain.
+        reservation = self.get_object()
+        if reservation.status != 'Pending':
+            return Response({'status': reservation.status, 'position': None})
+        ahead = Reserve.objects.filter(
+            isbn=reservation.isbn, status='Pending', reserve_id__lt=reservation.reserve_id
+        ).count()
+        return Response({'status': reservation.status, 'position': ahead + 1})
+
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_reservations(self, request):
         # Reader views their own reservations
-        reservations = Reserve.objects.filter(user=request.user).order_by('-reserve_date')
-        serializer = ReserveSerializer(reservations, many=True)
+        reservations = self.expand_queryset(Reserve.objects.filter(user=request.user)).order_by('-reserve_date', '-reserve_id')
+        page = self.paginate_queryset(reservations)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        serializer = self.get_serializer(reservations, many=True)
         return Response(serializer.data)
     
     def perform_create(self, serializer):
-        # Set current user as the creator of the reservation
-        serializer.save(user=self.request.user)
+        # Set current user as the creator of the reservation; if a copy is on
+        # the shelf it is set aside for the queue straight away
+        with transaction.atomic():
+            reservation = serializer.save(user=self.request.user, status='Pending')
+            services.fill_holds(reservation.isbn)
+        reservation.refresh_from_db()
 
 # -------------------------------
 # Review Management
 # -------------------------------
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(caching.CachedResponseMixin, SparseFieldsViewMixin, ExpandMixin, viewsets.ModelViewSet):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = PageOrKeysetPagination
+    expandable = ('edition', 'user')
+    cache_resources = ('review',)
+    cached_actions = ('list',)
+
+    def get_cache_resources(self):
+        # Expanded editions carry copy counts, which move with circulation
+        if 'edition' in self.get_expand():
+            return ('review', 'book')
+        return self.cache_resources
 
     def get_queryset(self):
         # Optional filtering by ISBN
-        queryset = Review.objects.all()
+        queryset = self.expand_queryset(Review.objects.order_by('-review_id'))
         isbn = self.request.query_params.get('isbn', None)
 
         if isbn is not None:
@@ -300,8 +552,11 @@ class ReviewViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_reviews(self, request):
         # Reader views their own reviews
-        reviews = Review.objects.filter(user=request.user).order_by('-review_date')
-        serializer = ReviewSerializer(reviews, many=True)
+        reviews = self.expand_queryset(Review.objects.filter(user=request.user)).order_by('-review_date', '-review_id')
+        page = self.paginate_queryset(reviews)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        serializer = self.get_serializer(reviews, many=True)
         return Response(serializer.data)
 
 # -------------------------------
@@ -356,11 +611,10 @@ def overdue_users_summary(request):
 
     today = timezone.now().date()
 
-    # Aggregate borrow records where return_date is null and due_date is past
-    overdue_qs = Borrow.objects.filter(
-        return_date__isnull=True,
-        due_date__lt=today
-    ).values('user__email').annotate(overdue_count=Count('borrow_id'))
+    # Aggregate the past-due rows of the open-loan ledger (unreturned loans only)
+    overdue_qs = OpenLoan.objects.overdue(today).values('user__email').annotate(
+        overdue_count=Count('borrow_id')
+    ).order_by('user__email')
 
     # Format response as a list of users and their overdue counts
     results = [
@@ -371,4 +625,111 @@ def overdue_users_summary(request):
         for entry in overdue_qs
     ]
 
-    return Response(results)
\ No newline at end of file
+    return Response(results)
+
+
+# -------------------------------------
+# Changes Feed (incremental sync)
+# -------------------------------------
+
+@api_view(['GET'])
+def changes_feed(request):
+    # Rows changed or deleted after ?since=<token>; follow "next" while has_more
+    kinds = list_param(request, 'kinds') or None
+    unknown = set(kinds or ()) - {kind for kind, _, _ in changes.KINDS}
+    if unknown:
+        return Response({"error": f"Unknown kinds: {', '.join(sorted(unknown))}."}, status=400)
+    try:
+        limit = int(request.query_params.get('limit', settings.CHANGES_PAGE_SIZE))
+    except ValueError:
+        return Response({"error": "limit must be an integer."}, status=400)
+
+    try:
+        data = changes.changes(request.user, request.query_params.get('since'), kinds, max(limit, 1))
+    except changes.InvalidToken:
+        return Response({"error": "Invalid since token."}, status=400)
+    except changes.ExpiredToken:
+        return Response({"error": "since token has expired; sync again without it."}, status=410)
+    return Response(data)
+
+
+# -------------------------------------
+# Dashboard Statistics
+# -------------------------------------
+
+def _count_by(queryset, field, choices):
+    # One GROUP BY query; choices with no rows are reported as 0
+    counts = {value: 0 for value, _ in choices}
+    for row in queryset.values(field).annotate(n=Count('pk')).order_by():
+        counts[row[field]] = row['n']
+    return counts
+
+
+def _borrow_counts(**filters):
+    # Archived loans are all returned, so they only add to the total
+    today = timezone.now().date()
+    counts = Borrow.objects.filter(**filters).aggregate(
+        total=Count('borrow_id'),
+        active=Count('borrow_id', filter=Q(return_date__isnull=True)),
+        overdue=Count('borrow_id', filter=Q(return_date__isnull=True, due_date__lt=today)),
+    )
+    counts['total'] += ArchivedBorrow.objects.filter(**filters).count()
+    return counts
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def library_stats(request):
+    # Library-wide totals computed with aggregates, cached for STATS_CACHE_TTL seconds
+    cache_key = 'library:stats'
+    data = cache.get(cache_key)
+    if data is None:
+        books_by_status = _count_by(Book.objects.all(), 'status', Book.STATUS_CHOICES)
+        users_by_role = _count_by(User.objects.all(), 'role', User.ROLE_CHOICES)
+        data = {
+            "books": {"total": sum(books_by_status.values()), "by_status": books_by_status},
+            "users": {"total": sum(users_by_role.values()), "by_role": users_by_role},
+            "borrows": _borrow_counts(),
+            "reservations": {"pending": Reserve.objects.filter(status='Pending').count()},
+        }
+        cache.set(cache_key, data, settings.STATS_CACHE_TTL)
+    return Response(data)
+
+
+@api_view(['GET'])
+@permission_classes([IsLibrarian])
+def cache_stats(request):
+    # Hit/miss counters of the book, review and rating response caches
+    return Response(caching.stats([
+        'book-list', 'book-retrieve', 'review-list', 'edition-ratings', 'edition-batch_ratings',
+    ]))
+
+
+@api_view(['GET'])
+@renderer_classes([metrics.PrometheusRenderer])
+@permission_classes([IsLibrarian | metrics.HasMetricsToken])
+def request_metrics(request):
+    # Per-route timings and query counts in Prometheus text format
+    return Response(metrics.registry.render())
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def user_stats(request, user_id):
+    # Readers may only see their own numbers; librarians can look up anyone
+    if request.user.role != 'Librarian' and request.user.pk != user_id:
+        return Response({"detail": "You can only view your own statistics."}, status=403)
+
+    cache_key = f'library:stats:user:{user_id}'
+    data = cache.get(cache_key)
+    if data is None:
+        data = {
+            "user_id": user_id,
+            "books": {"total": Book.objects.count()},
+            "borrows": _borrow_counts(user_id=user_id),
+            "reservations": {
+                "pending": Reserve.objects.filter(user_id=user_id, status='Pending').count()
+            },
+        }
+        cache.set(cache_key, data, settings.STATS_CACHE_TTL)
+    return Response(data)